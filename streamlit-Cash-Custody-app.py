@@ -1,279 +1,2439 @@
-import os
-import sqlite3
-import streamlit as st
-import pandas as pd
-from datetime import datetime
-
-# Paths and constants
-DB_DIR = "./data"
-DB_FILENAME = os.path.join(DB_DIR, "cash_custody.db")
-UPLOAD_FOLDER = "./uploads/"
-APP_TITLE = "Cash Custody Management System"
-CREDITS = "Created by Ibrahim Elnagar, Operation Manager | NATGAS"
-
-# Ensure required directories exist
-os.makedirs(DB_DIR, exist_ok=True)
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-
-# Initialize the database
-def init_database():
-    conn = sqlite3.connect(DB_FILENAME)
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS accounts (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL UNIQUE,
-            balance REAL DEFAULT 0
-        )
-    ''')
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS transactions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            date TEXT NOT NULL,
-            type TEXT NOT NULL,
-            description TEXT,
-            amount REAL NOT NULL,
-            from_account_id INTEGER,
-            to_account_id INTEGER,
-            file_path TEXT,
-            FOREIGN KEY (from_account_id) REFERENCES accounts (id),
-            FOREIGN KEY (to_account_id) REFERENCES accounts (id)
-        )
-    ''')
-    conn.commit()
-    conn.close()
-
-# Fetch all accounts
-def get_accounts():
-    conn = sqlite3.connect(DB_FILENAME)
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, name, balance FROM accounts")
-    accounts = cursor.fetchall()
-    conn.close()
-    return [{"id": row[0], "name": row[1], "balance": row[2]} for row in accounts]
-
-# Fetch all transactions
-def get_transactions():
-    conn = sqlite3.connect(DB_FILENAME)
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT t.id, t.date, t.type, t.description, t.amount,
-               a1.name AS from_account, a2.name AS to_account, t.file_path
-        FROM transactions t
-        LEFT JOIN accounts a1 ON t.from_account_id = a1.id
-        LEFT JOIN accounts a2 ON t.to_account_id = a2.id
-    ''')
-    transactions = cursor.fetchall()
-    conn.close()
-    return transactions
-
-# Add a new account
-def add_account(name, balance):
-    conn = sqlite3.connect(DB_FILENAME)
-    cursor = conn.cursor()
-    cursor.execute("INSERT INTO accounts (name, balance) VALUES (?, ?)", (name, balance))
-    conn.commit()
-    conn.close()
-
-# Add a new transaction
-def add_transaction(transaction_data):
-    """Add a new transaction and update account balances."""
-    conn = sqlite3.connect(DB_FILENAME)
-    cursor = conn.cursor()
-
-    # Insert the transaction into the database
-    cursor.execute('''
-        INSERT INTO transactions (date, type, description, amount, from_account_id, to_account_id, file_path)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    ''', transaction_data)
-
-    # Update account balances for transfers and deposits
-    transaction_type = transaction_data[1]
-    amount = transaction_data[3]
-    from_account_id = transaction_data[4]
-    to_account_id = transaction_data[5]
-
-    if transaction_type == "DEPOSIT":
-        if to_account_id:
-            cursor.execute("UPDATE accounts SET balance = balance + ? WHERE id = ?", (amount, to_account_id))
-        if from_account_id:
-            cursor.execute("UPDATE accounts SET balance = balance - ? WHERE id = ?", (amount, from_account_id))
-    elif transaction_type == "TRANSFER":
-        if from_account_id:
-            cursor.execute("UPDATE accounts SET balance = balance - ? WHERE id = ?", (amount, from_account_id))
-        if to_account_id:
-            cursor.execute("UPDATE accounts SET balance = balance + ? WHERE id = ?", (amount, to_account_id))
-    elif transaction_type == "EXPENSE":
-        if from_account_id:
-            cursor.execute("UPDATE accounts SET balance = balance - ? WHERE id = ?", (amount, from_account_id))
-        if to_account_id:
-            cursor.execute("UPDATE accounts SET balance = balance + ? WHERE id = ?", (amount, to_account_id))
-
-    conn.commit()
-    conn.close()
-
-# Export transactions to Excel
-def export_transactions():
-    conn = sqlite3.connect(DB_FILENAME)
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT t.date, t.type, t.description, t.amount,
-               a1.name AS from_account, a2.name AS to_account, t.file_path
-        FROM transactions t
-        LEFT JOIN accounts a1 ON t.from_account_id = a1.id
-        LEFT JOIN accounts a2 ON t.to_account_id = a2.id
-    ''')
-    transactions = cursor.fetchall()
-    conn.close()
-    df = pd.DataFrame(transactions, columns=[
-        "Date", "Type", "Description", "Amount", "From Account", "To Account", "File Path"
-    ])
-    excel_path = os.path.join(UPLOAD_FOLDER, "transactions.xlsx")
-    df.to_excel(excel_path, index=False)
-    return excel_path
-
-# Reset the application
-def reset_application():
-    if st.session_state.get("confirm_reset", False):
-        conn = sqlite3.connect(DB_FILENAME)
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM accounts")
-        cursor.execute("DELETE FROM transactions")
-        cursor.execute("DELETE FROM sqlite_sequence WHERE name='accounts'")
-        cursor.execute("DELETE FROM sqlite_sequence WHERE name='transactions'")
-        conn.commit()
-        conn.close()
-        st.success("Application reset successfully!")
-        st.session_state["confirm_reset"] = False
-        # Refresh accounts and transactions dynamically
-        with accounts_placeholder.container():
-            accounts = get_accounts()
-            st.dataframe(pd.DataFrame(accounts))
-        with transactions_placeholder.container():
-            transactions = get_transactions()
-            if transactions:
-                df_transactions = pd.DataFrame(transactions, columns=[
-                    "ID", "Date", "Type", "Description", "Amount", "From Account", "To Account", "File Path"
-                ])
-                df_transactions["File Link"] = df_transactions["File Path"].apply(
-                    lambda x: f'<a href="file:///{os.path.abspath(x)}" target="_blank">📂 Open File</a>' if x else "No File"
-                )
-                st.dataframe(df_transactions)
-            else:
-                st.write("No transactions available.")
-    else:
-        st.session_state["confirm_reset"] = st.sidebar.button("Confirm Reset")
-        if st.session_state["confirm_reset"]:
-            st.warning("Are you sure you want to reset the application? This action cannot be undone.")
-
-# Initialize the database before starting the app
-init_database()
-
-# Streamlit UI
-st.title(APP_TITLE)
-st.sidebar.header("Actions")
-st.markdown(f"### {CREDITS}")
-
-# Add custom CSS for headers and sidebar sections
-st.markdown(
-    """
-    <style>
-    .header {
-        background-color: #4CAF50;
-        color: white;
-        padding: 10px;
-        border-radius: 5px;
-    }
-    .sidebar-section {
-        background-color: #f0f0f0;
-        padding: 10px;
-        border-radius: 5px;
-        margin-bottom: 10px;
-    }
-    </style>
-    """,
-    unsafe_allow_html=True,
-)
-
-# Enhanced UI Example
-st.markdown('<div class="header"><h2>Accounts</h2></div>', unsafe_allow_html=True)
-accounts_placeholder = st.empty()
-with accounts_placeholder.container():
-    accounts = get_accounts()
-    st.dataframe(pd.DataFrame(accounts))
-
-st.divider()
-
-st.markdown('<div class="header"><h2>Transactions</h2></div>', unsafe_allow_html=True)
-transactions_placeholder = st.empty()
-with transactions_placeholder.container():
-    transactions = get_transactions()
-    if transactions:
-        df_transactions = pd.DataFrame(transactions, columns=[
-            "ID", "Date", "Type", "Description", "Amount", "From Account", "To Account", "File Path"
-        ])
-        df_transactions["File Link"] = df_transactions["File Path"].apply(
-            lambda x: f'<a href="file:///{os.path.abspath(x)}" target="_blank">📂 Open File</a>' if x else "No File"
-        )
-        st.dataframe(df_transactions)
-    else:
-        st.write("No transactions available.")
-
-# Add account
-st.sidebar.markdown('<div class="sidebar-section"><h3>Add Account</h3></div>', unsafe_allow_html=True)
-account_name = st.sidebar.text_input("Account Name")
-account_balance = st.sidebar.number_input("Initial Balance", min_value=0.0)
-if st.sidebar.button("Add Account"):
-    add_account(account_name, account_balance)
-    st.success(f"Account '{account_name}' added successfully!")
-    # Refresh accounts dynamically
-    with accounts_placeholder.container():
-        accounts = get_accounts()
-        st.dataframe(pd.DataFrame(accounts))
-
-# Add transaction
-st.sidebar.markdown('<div class="sidebar-section"><h3>Add Transaction</h3></div>', unsafe_allow_html=True)
-transaction_date = st.sidebar.date_input("Date")
-transaction_type = st.sidebar.selectbox("Type", ["DEPOSIT", "EXPENSE", "TRANSFER"])
-transaction_desc = st.sidebar.text_input("Description")
-transaction_amount = st.sidebar.number_input("Amount", min_value=0.0)
-from_account = st.sidebar.selectbox("From Account", [None] + [acc["name"] for acc in accounts])
-to_account = st.sidebar.selectbox("To Account", [None] + [acc["name"] for acc in accounts])
-uploaded_file = st.sidebar.file_uploader("Upload File")
-if st.sidebar.button("Add Transaction"):
-    file_path = None
-    if uploaded_file:
-        file_path = os.path.join(UPLOAD_FOLDER, uploaded_file.name)
-        with open(file_path, "wb") as f:
-            f.write(uploaded_file.read())
-    from_account_id = next((acc["id"] for acc in accounts if acc["name"] == from_account), None)
-    to_account_id = next((acc["id"] for acc in accounts if acc["name"] == to_account), None)
-    add_transaction((transaction_date, transaction_type, transaction_desc, transaction_amount, from_account_id, to_account_id, file_path))
-    st.success("Transaction added successfully!")
-    # Refresh accounts and transactions dynamically
-    with accounts_placeholder.container():
-        accounts = get_accounts()
-        st.dataframe(pd.DataFrame(accounts))
-    with transactions_placeholder.container():
-        transactions = get_transactions()
-        df_transactions = pd.DataFrame(transactions, columns=[
-            "ID", "Date", "Type", "Description", "Amount", "From Account", "To Account", "File Path"
-        ])
-        df_transactions["File Link"] = df_transactions["File Path"].apply(
-            lambda x: f'<a href="file:///{os.path.abspath(x)}" target="_blank">📂 Open File</a>' if x else "No File"
-        )
-        st.dataframe(df_transactions)
-
-# Reset button
-st.sidebar.markdown('<div class="sidebar-section"><h3>Reset Application</h3></div>', unsafe_allow_html=True)
-reset_application()
-
-# Export transactions
-st.sidebar.markdown('<div class="sidebar-section"><h3>Export Transactions</h3></div>', unsafe_allow_html=True)
-if st.sidebar.button("Export Transactions to Excel"):
-    excel_path = export_transactions()
-    st.sidebar.download_button(
-        label="Download Excel File",
-        data=open(excel_path, "rb").read(),
-        file_name="transactions.xlsx"
-    )
\ No newline at end of file
+import argparse
+import base64
+import calendar
+import csv
+import gzip
+import hashlib
+import html
+import io
+import json
+import mimetypes
+import os
+import queue
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import streamlit as st
+from streamlit import runtime
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+import pandas as pd
+from datetime import datetime, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+from openpyxl import Workbook, load_workbook
+import pyarrow as pa
+import pyarrow.parquet as pq
+from PIL import Image
+
+# PDF previews are rendered with pypdfium2 when it is installed
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
+
+# Attachments are compressed with zstd when it is installed, gzip otherwise
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Paths and constants
+DB_DIR = "./data"
+DB_FILENAME = os.path.join(DB_DIR, "cash_custody.db")
+UPLOAD_FOLDER = "./uploads/"
+ATTACHMENT_FOLDER = os.path.join(UPLOAD_FOLDER, "objects")
+APP_TITLE = "Cash Custody Management System"
+CREDITS = "Created by Ibrahim Elnagar, Operation Manager | NATGAS"
+
+# Database connection pool settings
+DB_POOL_SIZE = int(os.environ.get("CASH_CUSTODY_DB_POOL_SIZE", "5"))
+DB_TIMEOUT = float(os.environ.get("CASH_CUSTODY_DB_TIMEOUT", "30"))
+
+# SQLite performance profile; every value can be overridden through the environment.
+# The journal mode is persistent and set once in init_database, the remaining
+# PRAGMAs are applied to every connection when the pool opens it.
+DB_JOURNAL_MODE = os.environ.get("CASH_CUSTODY_DB_JOURNAL_MODE", "WAL").upper()
+CONNECTION_PRAGMAS = {
+    "busy_timeout": int(os.environ.get("CASH_CUSTODY_DB_BUSY_TIMEOUT", str(int(DB_TIMEOUT * 1000)))),
+    "synchronous": os.environ.get("CASH_CUSTODY_DB_SYNCHRONOUS", "NORMAL").upper(),
+    "cache_size": int(os.environ.get("CASH_CUSTODY_DB_CACHE_SIZE", "-32000")),  # negative = KiB
+    "mmap_size": int(os.environ.get("CASH_CUSTODY_DB_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "temp_store": os.environ.get("CASH_CUSTODY_DB_TEMP_STORE", "MEMORY").upper(),
+}
+
+# Schema migrations: rows per committed backfill batch, and accounts per ledger
+# rebuild batch
+MIGRATION_BATCH_SIZE = int(os.environ.get("CASH_CUSTODY_MIGRATION_BATCH_SIZE", "5000"))
+LEDGER_BACKFILL_ACCOUNTS = int(os.environ.get("CASH_CUSTODY_LEDGER_BACKFILL_ACCOUNTS", "50"))
+
+# Money is stored as integer minor units (piastres) and crosses the Python boundary
+# as Decimal, so balances and totals never pick up floating point drift
+MONEY_DECIMAL_PLACES = 2
+MINOR_UNITS = 10 ** MONEY_DECIMAL_PLACES
+
+# Table definitions; every money column is an INTEGER count of minor units
+TABLE_SCHEMAS = {
+    "accounts": '''
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL UNIQUE,
+        balance INTEGER DEFAULT 0,
+        opening_balance INTEGER DEFAULT 0
+    ''',
+    "transactions": '''
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        date TEXT NOT NULL,
+        type TEXT NOT NULL,
+        description TEXT,
+        amount INTEGER NOT NULL,
+        from_account_id INTEGER,
+        to_account_id INTEGER,
+        file_path TEXT,
+        attachment_id INTEGER,
+        FOREIGN KEY (from_account_id) REFERENCES accounts (id),
+        FOREIGN KEY (to_account_id) REFERENCES accounts (id),
+        FOREIGN KEY (attachment_id) REFERENCES attachments (id)
+    ''',
+    # Running balance per account after each posting, in (date, transaction) order
+    "balance_ledger": '''
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        transaction_id INTEGER NOT NULL,
+        account_id INTEGER NOT NULL,
+        date TEXT NOT NULL,
+        amount INTEGER NOT NULL,
+        balance INTEGER NOT NULL,
+        FOREIGN KEY (transaction_id) REFERENCES transactions (id),
+        FOREIGN KEY (account_id) REFERENCES accounts (id)
+    ''',
+    # Uploaded receipts, stored once per distinct content under their SHA-256
+    "attachments": '''
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        sha256 TEXT NOT NULL UNIQUE,
+        size INTEGER NOT NULL,
+        original_name TEXT,
+        mime_type TEXT,
+        storage_path TEXT NOT NULL,
+        created_at TEXT NOT NULL
+    ''',
+    # Posting totals per account, day and transaction type, kept current on every write
+    "daily_summary": '''
+        account_id INTEGER NOT NULL,
+        day TEXT NOT NULL,
+        type TEXT NOT NULL,
+        inflow INTEGER NOT NULL DEFAULT 0,
+        outflow INTEGER NOT NULL DEFAULT 0,
+        postings INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (account_id, day, type),
+        FOREIGN KEY (account_id) REFERENCES accounts (id)
+    ''',
+    # Closed months (YYYY-MM); postings dated in or before the latest one are refused
+    "period_closes": '''
+        month TEXT PRIMARY KEY,
+        closed_at TEXT NOT NULL,
+        archived INTEGER NOT NULL DEFAULT 0
+    ''',
+    # Balance of every account at the end of each closed month
+    "balance_snapshots": '''
+        account_id INTEGER NOT NULL,
+        month TEXT NOT NULL,
+        closing_balance INTEGER NOT NULL,
+        PRIMARY KEY (account_id, month),
+        FOREIGN KEY (account_id) REFERENCES accounts (id)
+    ''',
+    # Transactions of archived periods, keeping their original ids. It may live in an
+    # attached database, so it cannot declare foreign keys into the main one.
+    "transactions_archive": '''
+        id INTEGER PRIMARY KEY,
+        date TEXT NOT NULL,
+        type TEXT NOT NULL,
+        description TEXT,
+        amount INTEGER NOT NULL,
+        from_account_id INTEGER,
+        to_account_id INTEGER,
+        file_path TEXT,
+        attachment_id INTEGER
+    ''',
+    # Posting totals per account and month (YYYY-MM)
+    "monthly_summary": '''
+        account_id INTEGER NOT NULL,
+        month TEXT NOT NULL,
+        inflow INTEGER NOT NULL DEFAULT 0,
+        outflow INTEGER NOT NULL DEFAULT 0,
+        postings INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (account_id, month),
+        FOREIGN KEY (account_id) REFERENCES accounts (id)
+    ''',
+    # Single-row counter bumped by every write transaction
+    "data_version": '''
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        value INTEGER NOT NULL
+    ''',
+}
+MONEY_COLUMNS = {
+    "accounts": ("balance", "opening_balance"),
+    "transactions": ("amount",),
+    "balance_ledger": ("amount", "balance"),
+    "daily_summary": ("inflow", "outflow"),
+    "monthly_summary": ("inflow", "outflow"),
+}
+
+# Secondary indexes. The transaction account indexes lead with the foreign key and
+# carry date, type and amount so per-account history reads never touch the table.
+TRANSACTION_INDEXES = {
+    "idx_transactions_date": "transactions (date, id)",
+    "idx_transactions_type": "transactions (type, date)",
+    "idx_transactions_from_account_date": "transactions (from_account_id, date, type, amount)",
+    "idx_transactions_to_account_date": "transactions (to_account_id, date, type, amount)",
+    "idx_balance_ledger_account_date": "balance_ledger (account_id, date, transaction_id, balance)",
+}
+
+# Full-text index over transaction descriptions. It is an external-content FTS5 table,
+# so the text itself lives only in transactions; the triggers keep the index in step
+# with every insert, delete and description change.
+TRANSACTIONS_FTS_OPTIONS = "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'"
+TRANSACTIONS_FTS_SCHEMA = f'''
+    CREATE VIRTUAL TABLE IF NOT EXISTS transactions_fts USING fts5 (
+        description,
+        content = 'transactions', content_rowid = 'id',
+        {TRANSACTIONS_FTS_OPTIONS}
+    )
+'''
+TRANSACTIONS_FTS_TRIGGERS = {
+    "transactions_fts_insert": '''
+        AFTER INSERT ON transactions BEGIN
+            INSERT INTO transactions_fts (rowid, description) VALUES (new.id, new.description);
+        END
+    ''',
+    "transactions_fts_delete": '''
+        AFTER DELETE ON transactions BEGIN
+            INSERT INTO transactions_fts (transactions_fts, rowid, description)
+            VALUES ('delete', old.id, old.description);
+        END
+    ''',
+    "transactions_fts_update": '''
+        AFTER UPDATE OF description ON transactions BEGIN
+            INSERT INTO transactions_fts (transactions_fts, rowid, description)
+            VALUES ('delete', old.id, old.description);
+            INSERT INTO transactions_fts (rowid, description) VALUES (new.id, new.description);
+        END
+    ''',
+}
+SEARCH_PAGE_SIZE = int(os.environ.get("CASH_CUSTODY_SEARCH_PAGE_SIZE", "20"))
+SEARCH_SNIPPET_TOKENS = 16
+# Snippet() wraps matches in these control characters so the description can be
+# HTML-escaped before the highlight markup goes in
+SEARCH_HIGHLIGHT = ("\x02", "\x03")
+# Markdown punctuation in user text is written as character references so search
+# results render it literally
+MARKDOWN_ESCAPES = {ord(char): f"&#{ord(char)};" for char in "\\`*_{}[]()#+-.!|~$"}
+
+# Transactions panel
+TRANSACTIONS_PAGE_SIZE = int(os.environ.get("CASH_CUSTODY_PAGE_SIZE", "50"))
+PAGE_SIZE_OPTIONS = sorted({25, 50, 100, 250, TRANSACTIONS_PAGE_SIZE})
+TRANSACTION_COLUMNS = ["ID", "Date", "Type", "Description", "Amount", "From Account", "To Account", "File Path"]
+TRANSACTIONS_SELECT = '''
+    SELECT t.id, t.date, t.type, t.description, t.amount,
+           a1.name AS from_account, a2.name AS to_account, t.file_path
+    FROM {source} t
+    LEFT JOIN accounts a1 ON t.from_account_id = a1.id
+    LEFT JOIN accounts a2 ON t.to_account_id = a2.id
+'''
+# Add Transaction form widget keys, cleared together once a transaction is saved
+ADD_TRANSACTION_WIDGETS = ["transaction_date", "transaction_type", "transaction_desc", "transaction_amount",
+                           "transaction_from_account", "transaction_to_account", "transaction_file"]
+# Filter bar widget keys, cleared together by the Clear Filters button
+TRANSACTION_FILTER_WIDGETS = ["filter_range", "filter_type", "filter_from_account", "filter_to_account",
+                              "filter_min_amount", "filter_max_amount"]
+
+# Attachments are hashed and copied in chunks of this many bytes. Uploads above the
+# size limit (0 disables it) are rejected, and CASH_CUSTODY_ATTACHMENT_FSYNC=1 forces
+# each blob to disk before it is renamed into place.
+ATTACHMENT_CHUNK_SIZE = int(os.environ.get("CASH_CUSTODY_ATTACHMENT_CHUNK_SIZE", str(1024 * 1024)))
+ATTACHMENT_MAX_SIZE = int(os.environ.get("CASH_CUSTODY_ATTACHMENT_MAX_MB", "100")) * 1024 * 1024
+ATTACHMENT_FSYNC = os.environ.get("CASH_CUSTODY_ATTACHMENT_FSYNC", "0") == "1"
+
+# Attachment compression. Blobs are compressed with zstd when the zstandard package
+# is installed and gzip otherwise, and kept compressed only if that saves at least
+# 10%. Formats that are already compressed are stored as-is.
+ATTACHMENT_ENCODINGS = {"zstd": ".zst", "gzip": ".gz"}
+ATTACHMENT_ENCODING = "zstd" if zstandard is not None else "gzip"
+ATTACHMENT_ZSTD_LEVEL = 10
+ATTACHMENT_GZIP_LEVEL = 6
+ATTACHMENT_COMPRESS_MIN_SIZE = 4096
+ATTACHMENT_COMPRESS_MAX_RATIO = 0.9
+FILE_SIGNATURES = [
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF8", "image/gif"),
+    (b"II*\x00", "image/tiff"),
+    (b"MM\x00*", "image/tiff"),
+    (b"BM", "image/bmp"),
+    (b"%PDF", "application/pdf"),
+    (b"PK\x03\x04", "application/zip"),
+    (b"\x1f\x8b", "application/gzip"),
+    (b"\x28\xb5\x2f\xfd", "application/zstd"),
+    (b"7z\xbc\xaf\x27\x1c", "application/x-7z-compressed"),
+    (b"Rar!", "application/vnd.rar"),
+]
+INCOMPRESSIBLE_TYPES = {
+    "image/jpeg", "image/png", "image/gif", "image/webp", "application/zip", "application/gzip",
+    "application/zstd", "application/x-7z-compressed", "application/vnd.rar",
+}
+
+# Receipt previews, generated in the background after upload
+PREVIEW_WORKERS = int(os.environ.get("CASH_CUSTODY_PREVIEW_WORKERS", "2"))
+PREVIEW_SIZE = (160, 160)
+PREVIEW_QUALITY = 70
+PREVIEW_PDF_SCALE = 0.5
+PREVIEW_CACHE_ENTRIES = 500
+
+# Bulk import
+IMPORT_BATCH_SIZE = int(os.environ.get("CASH_CUSTODY_IMPORT_BATCH_SIZE", "1000"))
+
+# Exports
+EXPORT_CHUNK_SIZE = int(os.environ.get("CASH_CUSTODY_EXPORT_CHUNK_SIZE", "5000"))
+EXPORT_COLUMNS = ["Date", "Type", "Description", "Amount", "From Account", "To Account", "File Path"]
+EXPORT_FIELDS = ["date", "type", "description", "amount", "from_account", "to_account", "file_path"]
+EXPORT_PARQUET_SCHEMA = pa.schema([
+    ("date", pa.string()),
+    ("type", pa.string()),
+    ("description", pa.string()),
+    ("amount", pa.decimal128(18, MONEY_DECIMAL_PLACES)),
+    ("from_account", pa.string()),
+    ("to_account", pa.string()),
+    ("file_path", pa.string()),
+])
+
+# Posting rules: the effect each transaction type has on its (from, to) accounts.
+# Cash accounts are assets, so a debit raises the balance and a credit lowers it.
+# A new transaction type only needs an entry here.
+DEBIT, CREDIT = "debit", "credit"
+EFFECT_SIGNS = {DEBIT: 1, CREDIT: -1}
+POSTING_RULES = {
+    "DEPOSIT": (CREDIT, DEBIT),
+    "EXPENSE": (CREDIT, DEBIT),
+    "TRANSFER": (CREDIT, DEBIT),
+}
+TRANSACTION_TYPES = list(POSTING_RULES)
+
+# Sign applied to the amount on the (from, to) account, derived from the rules
+POSTING_SIGNS = {
+    transaction_type: (EFFECT_SIGNS[from_effect], EFFECT_SIGNS[to_effect])
+    for transaction_type, (from_effect, to_effect) in POSTING_RULES.items()
+}
+
+# Largest number of accounts updated by one grouped balance UPDATE
+BALANCE_UPDATE_BATCH_SIZE = 400
+
+# Upper bound on cached query results kept per reader
+CACHE_MAX_ENTRIES = int(os.environ.get("CASH_CUSTODY_CACHE_MAX_ENTRIES", "64"))
+
+# Period close. Archived transactions go to transactions_archive, which is kept in a
+# separate database file attached as "archive" when CASH_CUSTODY_ARCHIVE_DB is set.
+ARCHIVE_DB_FILENAME = os.environ.get("CASH_CUSTODY_ARCHIVE_DB", "")
+ARCHIVE_SCHEMA = "archive" if ARCHIVE_DB_FILENAME else "main"
+ARCHIVE_COLUMNS = "id, date, type, description, amount, from_account_id, to_account_id, file_path, attachment_id"
+# Archived descriptions stay searchable through a second full-text index, filled as
+# rows are archived since no trigger can span the two database files
+ARCHIVE_FTS_SCHEMA = f'''
+    CREATE VIRTUAL TABLE IF NOT EXISTS {ARCHIVE_SCHEMA}.transactions_archive_fts USING fts5 (
+        description,
+        content = 'transactions_archive', content_rowid = 'id',
+        {TRANSACTIONS_FTS_OPTIONS}
+    )
+'''
+
+# Dashboard tab. The analytics frame holds only the columns the charts use, and at
+# most this many versions of it are cached, since it spans the whole ledger.
+DASHBOARD_CACHE_ENTRIES = 2
+DASHBOARD_FREQUENCIES = {"Weekly": "W-MON", "Monthly": "MS"}
+DASHBOARD_TOP_DESCRIPTIONS = 10
+DASHBOARD_BURN_DAYS = int(os.environ.get("CASH_CUSTODY_BURN_DAYS", "90"))
+
+# SQLite reports these PRAGMAs as integers when read back
+PRAGMA_VALUE_CODES = {
+    "synchronous": {"OFF": 0, "NORMAL": 1, "FULL": 2, "EXTRA": 3},
+    "temp_store": {"DEFAULT": 0, "FILE": 1, "MEMORY": 2},
+}
+
+# Ensure required directories exist
+os.makedirs(DB_DIR, exist_ok=True)
+os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+
+# Shared SQLite connection pool
+class ConnectionPool:
+    """Fixed-size pool of SQLite connections shared by every session and rerun."""
+
+    def __init__(self, database, size=DB_POOL_SIZE, pragmas=None, attached=None):
+        self.database = database
+        self.size = max(1, size)
+        self.pragmas = dict(pragmas or {})
+        self.attached = dict(attached or {})
+        self._idle = queue.LifoQueue(maxsize=self.size)
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.database, timeout=DB_TIMEOUT, check_same_thread=False)
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        for schema, filename in self.attached.items():
+            conn.execute(f"ATTACH DATABASE ? AS {schema}", (filename,))
+        return conn
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            can_open = self._opened < self.size
+            if can_open:
+                self._opened += 1
+        if not can_open:
+            # Every connection is checked out; wait for one to come back
+            return self._idle.get(timeout=DB_TIMEOUT)
+        try:
+            return self._connect()
+        except Exception:
+            with self._lock:
+                self._opened -= 1
+            raise
+
+    def release(self, conn):
+        # Never hand out a connection with a half-finished transaction
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put_nowait(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.release(conn)
+
+    def close_all(self):
+        with self._lock:
+            while True:
+                try:
+                    self._idle.get_nowait().close()
+                except queue.Empty:
+                    break
+                self._opened -= 1
+
+@st.cache_resource
+def get_connection_pool():
+    attached = {ARCHIVE_SCHEMA: ARCHIVE_DB_FILENAME} if ARCHIVE_DB_FILENAME else None
+    return ConnectionPool(DB_FILENAME, DB_POOL_SIZE, CONNECTION_PRAGMAS, attached)
+
+# Borrow a pooled connection for the duration of a with-block
+def get_connection():
+    return get_connection_pool().connection()
+
+# Data version kept in the database. Every write transaction bumps it before it
+# commits, so writes made by the command line or another server process are picked
+# up as well. The cached readers below take it as an argument: a new version is a
+# cache miss, and an unchanged one costs a single primary-key read.
+def current_data_version():
+    with get_connection() as conn:
+        return conn.execute("SELECT value FROM data_version WHERE id = 1").fetchone()[0]
+
+# The transactions version only moves when the set of transactions changes. The
+# dashboard frame is keyed on it, so adding an account or closing a period does not
+# rebuild a frame that holds every transaction.
+def current_transactions_version():
+    with get_connection() as conn:
+        return conn.execute("SELECT transactions_value FROM data_version WHERE id = 1").fetchone()[0]
+
+def bump_data_version(conn, transactions=False):
+    if transactions:
+        conn.execute(
+            "UPDATE data_version SET value = value + 1, transactions_value = transactions_value + 1 WHERE id = 1"
+        )
+    else:
+        conn.execute("UPDATE data_version SET value = value + 1 WHERE id = 1")
+
+# A full script run reads the data version once and hands it to every panel. A
+# fragment rerun does not execute the script body and is called with the arguments
+# of the last full run, so it reads the version itself.
+def fragment_data_version(data_version):
+    ctx = get_script_run_ctx()
+    if ctx is not None and ctx.fragment_ids_this_run:
+        return current_data_version()
+    return data_version
+
+# Compare the live PRAGMA values of a connection against the configured profile
+def verify_database_profile(conn):
+    issues = []
+    journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0].upper()
+    if journal_mode != DB_JOURNAL_MODE:
+        issues.append(f"journal_mode is {journal_mode}, expected {DB_JOURNAL_MODE}")
+    for name, expected in CONNECTION_PRAGMAS.items():
+        actual = conn.execute(f"PRAGMA {name}").fetchone()[0]
+        expected = PRAGMA_VALUE_CODES.get(name, {}).get(expected, expected)
+        if str(actual) != str(expected):
+            issues.append(f"{name} is {actual}, expected {expected}")
+    return issues
+
+# Convert a user-facing amount (float, str or Decimal) to integer minor units
+def to_minor_units(value):
+    return int((Decimal(str(value)) * MINOR_UNITS).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+# Convert stored minor units back to a Decimal amount
+def from_minor_units(value):
+    return None if value is None else Decimal(value).scaleb(-MONEY_DECIMAL_PLACES)
+
+# Last day of a YYYY-MM month as an ISO date string
+def month_end(month):
+    year, month_number = (int(part) for part in month.split("-"))
+    return f"{month}-{calendar.monthrange(year, month_number)[1]:02d}"
+
+# SQL producing one (transaction_id, account_id, date, amount) posting row per side
+# of every transaction, with the amount signed according to POSTING_SIGNS. An
+# (first_id, last_id) range limits it to those transactions, for batched backfills.
+def postings_cte(id_range=None):
+    rules = ", ".join("(?, ?, ?)" for _ in POSTING_SIGNS)
+    params = [value for rule_type, signs in POSTING_SIGNS.items() for value in (rule_type, *signs)]
+    join, in_range = "JOIN", ""
+    if id_range is not None:
+        # CROSS JOIN keeps transactions as the outer loop, so the range is a rowid
+        # seek rather than a filter over the type index
+        join, in_range = "CROSS JOIN", " AND t.id BETWEEN ? AND ?"
+        params += [*id_range, *id_range]
+    sql = f'''
+        rules (type, from_sign, to_sign) AS (VALUES {rules}),
+        postings AS (
+            SELECT t.id AS transaction_id, t.from_account_id AS account_id, t.date, r.from_sign * t.amount AS amount
+            FROM transactions t {join} rules r ON r.type = t.type
+            WHERE t.from_account_id IS NOT NULL{in_range}
+            UNION ALL
+            SELECT t.id, t.to_account_id, t.date, r.to_sign * t.amount
+            FROM transactions t {join} rules r ON r.type = t.type
+            WHERE t.to_account_id IS NOT NULL{in_range}
+        )
+    '''
+    return sql, params
+
+# Rebuild the running-balance ledger from the transactions table, either entirely
+# or only for the given accounts. Passing the latest closed month starts the rebuild
+# from that month's closing snapshots: frozen postings, which may already be archived,
+# keep their ledger rows and only later postings are recomputed.
+def rebuild_balance_ledger(conn, account_ids=None, closed_month=None):
+    cte, params = postings_cte()
+    conditions, condition_params = [], []
+    if account_ids is not None:
+        account_ids = list(account_ids)
+        conditions.append(f"{{p}}account_id IN ({', '.join('?' for _ in account_ids)})")
+        condition_params += account_ids
+    opening_balance, snapshot_join = "a.opening_balance", ""
+    if closed_month is not None:
+        conditions.append("{p}date > ?")
+        condition_params.append(month_end(closed_month))
+        opening_balance = "COALESCE(s.closing_balance, a.opening_balance)"
+        snapshot_join = "LEFT JOIN balance_snapshots s ON s.account_id = a.id AND s.month = ?"
+        params.append(closed_month)
+    where = " AND ".join(conditions)
+    conn.execute(
+        "DELETE FROM balance_ledger" + (" WHERE " + where.format(p="") if where else ""), condition_params
+    )
+    conn.execute(f'''
+        WITH {cte}
+        INSERT INTO balance_ledger (transaction_id, account_id, date, amount, balance)
+        SELECT p.transaction_id, p.account_id, p.date, p.amount,
+               {opening_balance} + SUM(p.amount) OVER (
+                   PARTITION BY p.account_id ORDER BY p.date, p.transaction_id ROWS UNBOUNDED PRECEDING
+               )
+        FROM postings p JOIN accounts a ON a.id = p.account_id
+        {snapshot_join}
+        {"WHERE " + where.format(p="p.") if where else ""}
+        ORDER BY p.account_id, p.date, p.transaction_id
+    ''', params + condition_params)
+
+# Add posting totals to the daily and monthly summaries. `postings` holds
+# (account_id, date, type, amount) tuples; they are summed per key in Python first so
+# each summary row is upserted once per call.
+def apply_summary_postings(conn, postings):
+    daily, monthly = {}, {}
+    for account_id, date, transaction_type, amount in postings:
+        day = str(date)[:10]
+        delta = (max(amount, 0), max(-amount, 0), 1)
+        for totals, key in ((daily, (account_id, day, transaction_type)), (monthly, (account_id, day[:7]))):
+            totals[key] = tuple(map(sum, zip(totals.get(key, (0, 0, 0)), delta)))
+    conn.executemany('''
+        INSERT INTO daily_summary (account_id, day, type, inflow, outflow, postings) VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (account_id, day, type) DO UPDATE SET
+            inflow = inflow + excluded.inflow,
+            outflow = outflow + excluded.outflow,
+            postings = postings + excluded.postings
+    ''', [(*key, *totals) for key, totals in daily.items()])
+    conn.executemany('''
+        INSERT INTO monthly_summary (account_id, month, inflow, outflow, postings) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (account_id, month) DO UPDATE SET
+            inflow = inflow + excluded.inflow,
+            outflow = outflow + excluded.outflow,
+            postings = postings + excluded.postings
+    ''', [(*key, *totals) for key, totals in monthly.items()])
+
+# Add the postings of transactions first_id..last_id to both summary tables. Rows are
+# upserted like apply_summary_postings does, so batches can run in any order.
+def backfill_summaries(conn, first_id, last_id):
+    cte, params = postings_cte((first_id, last_id))
+    for table, key_columns, key in (
+        ("daily_summary", "account_id, day, type", "substr(p.date, 1, 10), t.type"),
+        ("monthly_summary", "account_id, month", "substr(p.date, 1, 7)"),
+    ):
+        conn.execute(f'''
+            WITH {cte}
+            INSERT INTO {table} ({key_columns}, inflow, outflow, postings)
+            SELECT p.account_id, {key},
+                   SUM(CASE WHEN p.amount > 0 THEN p.amount ELSE 0 END),
+                   SUM(CASE WHEN p.amount < 0 THEN -p.amount ELSE 0 END),
+                   COUNT(*)
+            FROM postings p JOIN transactions t ON t.id = p.transaction_id
+            GROUP BY p.account_id, {key}
+            ON CONFLICT ({key_columns}) DO UPDATE SET
+                inflow = inflow + excluded.inflow,
+                outflow = outflow + excluded.outflow,
+                postings = postings + excluded.postings
+        ''', params)
+
+# Sharded location of a blob in the attachment store: objects/ab/cd/abcd...[.gz|.zst]
+# The suffix records how the blob was compressed, so it can be read back without
+# consulting the database.
+def attachment_storage_path(sha256, encoding=None):
+    path = os.path.join(ATTACHMENT_FOLDER, sha256[:2], sha256[2:4], sha256)
+    return path + ATTACHMENT_ENCODINGS[encoding] if encoding else path
+
+# Existing blob for a content hash, whichever way it was stored
+def find_attachment_blob(sha256):
+    for encoding in (None, *ATTACHMENT_ENCODINGS):
+        path = attachment_storage_path(sha256, encoding)
+        if os.path.exists(path):
+            return path
+    return None
+
+# MIME type from the leading bytes of a file, for the formats we care about
+def sniff_mime_type(head):
+    for signature, mime_type in FILE_SIGNATURES:
+        if head.startswith(signature):
+            return mime_type
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+# Compress a finished temporary file next to itself and return the new path
+def compress_attachment(path, encoding):
+    with open(path, "rb") as src, tempfile.NamedTemporaryFile(
+        dir=os.path.dirname(path), prefix=".upload-", delete=False
+    ) as dst:
+        if encoding == "zstd":
+            zstandard.ZstdCompressor(level=ATTACHMENT_ZSTD_LEVEL).copy_stream(src, dst)
+        else:
+            with gzip.GzipFile(fileobj=dst, mode="wb", compresslevel=ATTACHMENT_GZIP_LEVEL, mtime=0) as gz:
+                shutil.copyfileobj(src, gz, ATTACHMENT_CHUNK_SIZE)
+        if ATTACHMENT_FSYNC:
+            dst.flush()
+            os.fsync(dst.fileno())
+    return dst.name
+
+# Open a stored blob for reading, decompressing on the fly when needed
+def open_attachment_blob(storage_path):
+    if storage_path.endswith(ATTACHMENT_ENCODINGS["zstd"]):
+        if zstandard is None:
+            raise RuntimeError(f"zstandard is required to read {storage_path}")
+        return zstandard.ZstdDecompressor().stream_reader(open(storage_path, "rb"), closefd=True)
+    if storage_path.endswith(ATTACHMENT_ENCODINGS["gzip"]):
+        return gzip.open(storage_path, "rb")
+    return open(storage_path, "rb")
+
+# Store a file object in the content-addressed attachment store and return
+# (attachment_id, storage_path). The content is copied in fixed-size chunks to a
+# temporary file while it is hashed, then renamed into place atomically, so memory
+# use does not depend on the file size. Content that is not already compressed is
+# stored compressed when that saves enough space. Identical content is written to
+# disk and recorded in the attachments table only once. The caller commits.
+def store_attachment(conn, fileobj, original_name, mime_type=None):
+    os.makedirs(ATTACHMENT_FOLDER, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    head = b""
+    fileobj.seek(0)
+    with tempfile.NamedTemporaryFile(dir=ATTACHMENT_FOLDER, prefix=".upload-", delete=False) as temp:
+        try:
+            for chunk in iter(lambda: fileobj.read(ATTACHMENT_CHUNK_SIZE), b""):
+                size += len(chunk)
+                if ATTACHMENT_MAX_SIZE and size > ATTACHMENT_MAX_SIZE:
+                    raise ValueError(
+                        f"{original_name} is larger than the {ATTACHMENT_MAX_SIZE // (1024 * 1024)} MB upload limit"
+                    )
+                if not head:
+                    head = chunk[:64]
+                digest.update(chunk)
+                temp.write(chunk)
+            if ATTACHMENT_FSYNC:
+                temp.flush()
+                os.fsync(temp.fileno())
+        except BaseException:
+            temp.close()
+            os.remove(temp.name)
+            raise
+    sha256 = digest.hexdigest()
+    sniffed_type = sniff_mime_type(head)
+    mime_type = mime_type or sniffed_type or mimetypes.guess_type(original_name or "")[0]
+
+    storage_path = find_attachment_blob(sha256)
+    if storage_path:
+        os.remove(temp.name)
+    else:
+        source, encoding = temp.name, None
+        if sniffed_type not in INCOMPRESSIBLE_TYPES and size >= ATTACHMENT_COMPRESS_MIN_SIZE:
+            compressed = compress_attachment(temp.name, ATTACHMENT_ENCODING)
+            if os.path.getsize(compressed) <= size * ATTACHMENT_COMPRESS_MAX_RATIO:
+                os.remove(temp.name)
+                source, encoding = compressed, ATTACHMENT_ENCODING
+            else:
+                os.remove(compressed)
+        storage_path = attachment_storage_path(sha256, encoding)
+        os.makedirs(os.path.dirname(storage_path), exist_ok=True)
+        # NamedTemporaryFile creates the file private to the owner
+        os.chmod(source, 0o644)
+        os.replace(source, storage_path)
+
+    conn.execute('''
+        INSERT INTO attachments (sha256, size, original_name, mime_type, storage_path, created_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (sha256) DO NOTHING
+    ''', (sha256, size, original_name, mime_type, storage_path, datetime.now().isoformat(timespec="seconds")))
+    attachment_id = conn.execute("SELECT id FROM attachments WHERE sha256 = ?", (sha256,)).fetchone()[0]
+    return attachment_id, storage_path
+
+# Original name, MIME type and decompressed content of a transaction's attachment
+def read_transaction_attachment(transaction_id):
+    with get_connection() as conn:
+        row = conn.execute('''
+            SELECT a.storage_path, a.original_name, a.mime_type
+            FROM transactions t JOIN attachments a ON a.id = t.attachment_id
+            WHERE t.id = ?
+        ''', (transaction_id,)).fetchone()
+    if row is None:
+        return None
+    with open_attachment_blob(row[0]) as f:
+        return row[1], row[2], f.read()
+
+# Previews are small JPEGs stored next to the attachment blob
+def preview_path(storage_path):
+    return storage_path + ".preview.jpg"
+
+# Render a first-page/first-frame thumbnail for an attachment, if a local library
+# can read it. Returns the preview path, or None when no preview could be made.
+def generate_preview(storage_path, mime_type=None):
+    target = preview_path(storage_path)
+    if os.path.exists(target):
+        return target
+    mime_type = mime_type or ""
+    try:
+        source = storage_path
+        if storage_path.endswith(tuple(ATTACHMENT_ENCODINGS.values())):
+            with open_attachment_blob(storage_path) as f:
+                source = io.BytesIO(f.read())
+        if mime_type == "application/pdf":
+            if pdfium is None:
+                return None
+            document = pdfium.PdfDocument(source)
+            try:
+                image = document[0].render(scale=PREVIEW_PDF_SCALE).to_pil()
+            finally:
+                document.close()
+        elif mime_type.startswith("image/"):
+            image = Image.open(source)
+            image.seek(0)
+        else:
+            return None
+        image.thumbnail(PREVIEW_SIZE)
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(target), suffix=".jpg", delete=False) as temp:
+            image.convert("RGB").save(temp, "JPEG", quality=PREVIEW_QUALITY)
+        os.chmod(temp.name, 0o644)
+        os.replace(temp.name, target)
+        return target
+    except Exception:
+        # A damaged or unsupported file simply has no preview
+        return None
+
+@st.cache_resource
+def get_preview_executor():
+    return ThreadPoolExecutor(max_workers=PREVIEW_WORKERS, thread_name_prefix="preview")
+
+# Queue preview generation so the upload request does not wait for it
+def schedule_preview(storage_path, mime_type=None):
+    get_preview_executor().submit(generate_preview, storage_path, mime_type)
+
+# Inline data URI for a generated preview; previews never change once written
+@st.cache_data(max_entries=PREVIEW_CACHE_ENTRIES)
+def load_preview_data_uri(path):
+    with open(path, "rb") as f:
+        return "data:image/jpeg;base64," + base64.b64encode(f.read()).decode("ascii")
+
+# Preview column for the visible rows; empty while a preview is still being made
+def preview_column(file_paths):
+    previews = []
+    for file_path in file_paths:
+        path = preview_path(file_path) if isinstance(file_path, str) and file_path else None
+        previews.append(load_preview_data_uri(path) if path and os.path.exists(path) else None)
+    return previews
+
+# Run a backfill over the rows of `table` in id ranges of `batch_size`, committing
+# after each range so concurrent writers are never locked out for long.
+# `apply_batch(conn, first_id, last_id)` must be idempotent, since an interrupted
+# migration starts over on the next run.
+def backfill_in_batches(conn, table, apply_batch, batch_size=None):
+    batch_size = batch_size or MIGRATION_BATCH_SIZE
+    first_id, last_id = conn.execute(f"SELECT MIN(id), MAX(id) FROM {table}").fetchone()
+    if first_id is None:
+        return
+    for batch_start in range(first_id, last_id + 1, batch_size):
+        apply_batch(conn, batch_start, batch_start + batch_size - 1)
+        conn.commit()
+
+# Copy rows of a REAL-money table into its {table}_migrated twin with the money
+# columns in minor units. Rows copied before are replaced, so a range can be redone.
+def copy_in_minor_units(conn, table, condition="", params=()):
+    columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+    selected = ", ".join(
+        f"CAST(ROUND({column} * {MINOR_UNITS}) AS INTEGER)" if column in MONEY_COLUMNS[table] else column
+        for column in columns
+    )
+    conn.execute(
+        f"INSERT OR REPLACE INTO {table}_migrated ({', '.join(columns)}) SELECT {selected} FROM {table} {condition}",
+        params,
+    )
+
+# Rewrite databases created with REAL money columns to integer minor units. SQLite
+# cannot change a column type in place, so each table is copied into a new one in id
+# batches, and only the swap runs in one short write transaction. The swap copies the
+# small accounts table again, for balances changed meanwhile, plus any transactions
+# posted since their batch; transactions are otherwise only ever appended. The ledger
+# is recreated empty and left for the caller to backfill.
+def migrate_money_to_minor_units(conn):
+    for table in ("accounts", "transactions"):
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {table}_migrated ({TABLE_SCHEMAS[table]})")
+        conn.commit()
+        backfill_in_batches(
+            conn, table,
+            lambda conn, first_id, last_id, table=table: copy_in_minor_units(
+                conn, table, "WHERE id BETWEEN ? AND ?", (first_id, last_id)
+            ),
+        )
+
+    conn.execute("BEGIN IMMEDIATE")
+    copy_in_minor_units(conn, "accounts")
+    copy_in_minor_units(conn, "transactions", "WHERE id > (SELECT COALESCE(MAX(id), 0) FROM transactions_migrated)")
+    for table in ("accounts", "transactions"):
+        conn.execute(f"DROP TABLE {table}")
+        conn.execute(f"ALTER TABLE {table}_migrated RENAME TO {table}")
+    conn.execute("DROP TABLE balance_ledger")
+    conn.execute(f"CREATE TABLE balance_ledger ({TABLE_SCHEMAS['balance_ledger']})")
+    conn.commit()
+
+# Migration 1: everything up to and including the running-balance ledger. Brings
+# both fresh databases and ones created by the original script to the same shape.
+def migrate_baseline(conn):
+    cursor = conn.cursor()
+    for table in ("accounts", "transactions", "balance_ledger"):
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {table} ({TABLE_SCHEMAS[table]})")
+
+    # Accounts created before the ledger existed: derive the opening balance
+    # by backing every posting out of the current balance. The column is added in
+    # the same transaction, so an interrupted run never leaves it at its default.
+    account_columns = [row[1] for row in cursor.execute("PRAGMA table_info(accounts)")]
+    if "opening_balance" not in account_columns:
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute("ALTER TABLE accounts ADD COLUMN opening_balance INTEGER DEFAULT 0")
+        cte, params = postings_cte()
+        cursor.execute(f'''
+            WITH {cte}
+            UPDATE accounts SET opening_balance = balance - COALESCE(
+                (SELECT SUM(p.amount) FROM postings p WHERE p.account_id = accounts.id), 0
+            )
+        ''', params)
+    conn.commit()
+
+    column_types = {row[1]: row[2] for row in cursor.execute("PRAGMA table_info(transactions)")}
+    if column_types["amount"].upper() == "REAL":
+        migrate_money_to_minor_units(conn)
+
+    # Backfill whenever the ledger row count differs from the posting count, which
+    # also resumes a backfill that was interrupted part way. Rebuilding an account
+    # range replaces its ledger rows, so batches already done are simply redone.
+    cte, params = postings_cte()
+    posting_count = cursor.execute(
+        f"WITH {cte} SELECT COUNT(*) FROM postings p JOIN accounts a ON a.id = p.account_id", params
+    ).fetchone()[0]
+    ledger_count = cursor.execute("SELECT COUNT(*) FROM balance_ledger").fetchone()[0]
+    if ledger_count != posting_count:
+        backfill_in_batches(
+            conn, "accounts",
+            lambda conn, first_id, last_id: rebuild_balance_ledger(conn, range(first_id, last_id + 1)),
+            batch_size=LEDGER_BACKFILL_ACCOUNTS,
+        )
+
+    # Existing databases pick up missing indexes here as well
+    for index_name, definition in TRANSACTION_INDEXES.items():
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {definition}")
+
+# Move files referenced by existing transactions into the attachment store
+def backfill_attachments(conn, first_id, last_id):
+    transactions = conn.execute('''
+        SELECT id, file_path FROM transactions
+        WHERE id BETWEEN ? AND ? AND attachment_id IS NULL AND file_path IS NOT NULL
+    ''', (first_id, last_id)).fetchall()
+    for transaction_id, file_path in transactions:
+        if not os.path.isfile(file_path):
+            continue
+        try:
+            with open(file_path, "rb") as f:
+                attachment_id, storage_path = store_attachment(conn, f, os.path.basename(file_path))
+        except ValueError:
+            # Over the upload size limit; leave it as a plain file_path reference
+            continue
+        conn.execute(
+            "UPDATE transactions SET attachment_id = ?, file_path = ? WHERE id = ?",
+            (attachment_id, storage_path, transaction_id),
+        )
+
+# Migration 2: content-addressed attachment store linked from transactions
+def migrate_attachments(conn):
+    conn.execute(f"CREATE TABLE IF NOT EXISTS attachments ({TABLE_SCHEMAS['attachments']})")
+    transaction_columns = [row[1] for row in conn.execute("PRAGMA table_info(transactions)")]
+    if "attachment_id" not in transaction_columns:
+        conn.execute("ALTER TABLE transactions ADD COLUMN attachment_id INTEGER REFERENCES attachments (id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_transactions_attachment ON transactions (attachment_id)")
+    conn.commit()
+    backfill_in_batches(conn, "transactions", backfill_attachments)
+
+# Index the descriptions of rows first_id..last_id of a schema-qualified transaction
+# table in its <table>_fts index. Rows the index already holds, from the triggers or
+# an interrupted earlier run, are skipped.
+def index_descriptions(conn, table, first_id, last_id):
+    conn.execute(f'''
+        INSERT INTO {table}_fts (rowid, description)
+        SELECT t.id, t.description FROM {table} t
+        WHERE t.id BETWEEN ? AND ?
+          AND NOT EXISTS (SELECT 1 FROM {table}_fts_docsize d WHERE d.id = t.id)
+    ''', (first_id, last_id))
+
+def backfill_transactions_fts(conn, first_id, last_id):
+    index_descriptions(conn, "main.transactions", first_id, last_id)
+
+# Migration 3: full-text index over transaction descriptions
+def migrate_transactions_fts(conn):
+    conn.execute(TRANSACTIONS_FTS_SCHEMA)
+    for trigger_name, definition in TRANSACTIONS_FTS_TRIGGERS.items():
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS {trigger_name} {definition}")
+    conn.commit()
+    backfill_in_batches(conn, "transactions", backfill_transactions_fts)
+
+# Migration 4: pre-aggregated daily and monthly posting summaries
+def migrate_summaries(conn):
+    # Summary rows are only ever read and upserted by primary key
+    for table in ("daily_summary", "monthly_summary"):
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({TABLE_SCHEMAS[table]}) WITHOUT ROWID")
+    # Batches add to the totals, so a rerun after an interruption starts from empty
+    # tables rather than counting the finished batches twice
+    conn.execute("DELETE FROM daily_summary")
+    conn.execute("DELETE FROM monthly_summary")
+    conn.commit()
+    backfill_in_batches(conn, "transactions", backfill_summaries)
+
+# Migration 5: period closes and closing balance snapshots. The archive table is
+# created by the first archiving close, in whichever database holds the archive.
+def migrate_period_close(conn):
+    conn.execute(f"CREATE TABLE IF NOT EXISTS period_closes ({TABLE_SCHEMAS['period_closes']})")
+    conn.execute(
+        f"CREATE TABLE IF NOT EXISTS balance_snapshots ({TABLE_SCHEMAS['balance_snapshots']}) WITHOUT ROWID"
+    )
+    conn.commit()
+
+# Migration 6: data version counter shared by every process using the database
+def migrate_data_version(conn):
+    conn.execute(f"CREATE TABLE IF NOT EXISTS data_version ({TABLE_SCHEMAS['data_version']})")
+    conn.execute("INSERT OR IGNORE INTO data_version (id, value) VALUES (1, 0)")
+    conn.commit()
+
+# Migration 7: full-text index over archives created before archiving kept one
+def migrate_archive_fts(conn):
+    if not archive_table_exists(conn):
+        return
+    archive_table = f"{ARCHIVE_SCHEMA}.transactions_archive"
+    conn.execute(ARCHIVE_FTS_SCHEMA)
+    conn.commit()
+    backfill_in_batches(
+        conn, archive_table,
+        lambda conn, first_id, last_id: index_descriptions(conn, archive_table, first_id, last_id),
+    )
+
+# Migration 8: transactions-only version counter next to the data version
+def migrate_transactions_version(conn):
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(data_version)")]
+    if "transactions_value" not in columns:
+        conn.execute("ALTER TABLE data_version ADD COLUMN transactions_value INTEGER NOT NULL DEFAULT 0")
+    conn.commit()
+
+# Ordered (version, description, migration) entries. Append new migrations here;
+# never edit or reorder one that has shipped.
+MIGRATIONS = [
+    (1, "Baseline schema with integer money columns and balance ledger", migrate_baseline),
+    (2, "Content-addressed attachment store", migrate_attachments),
+    (3, "Full-text search over transaction descriptions", migrate_transactions_fts),
+    (4, "Daily and monthly posting summaries", migrate_summaries),
+    (5, "Period close with closing balance snapshots", migrate_period_close),
+    (6, "Data version counter shared across processes", migrate_data_version),
+    (7, "Full-text search over archived transactions", migrate_archive_fts),
+    (8, "Transactions-only data version for the dashboard", migrate_transactions_version),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+# Highest migration version applied to the database; 0 for unversioned databases
+def get_schema_version(conn):
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'schema_version'"
+    ).fetchone()
+    if not exists:
+        return 0
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+# Apply every pending migration in order, recording each one as it completes
+def apply_migrations(conn):
+    conn.execute("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)")
+    version_columns = [row[1] for row in conn.execute("PRAGMA table_info(schema_version)")]
+    for column in ("description", "applied_at"):
+        if column not in version_columns:
+            conn.execute(f"ALTER TABLE schema_version ADD COLUMN {column} TEXT")
+    current_version = get_schema_version(conn)
+    for version, description, migrate in MIGRATIONS:
+        if version <= current_version:
+            continue
+        migrate(conn)
+        conn.execute(
+            "INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+            (version, description, datetime.now().isoformat(timespec="seconds")),
+        )
+        conn.commit()
+
+# Initialize the database
+def init_database():
+    """Switch the journal mode, apply pending migrations and return any profile mismatches.
+
+    Databases already at SCHEMA_VERSION skip every DDL statement and commit, so
+    only the profile check runs.
+    """
+    with get_connection() as conn:
+        conn.execute(f"PRAGMA journal_mode = {DB_JOURNAL_MODE}")
+        if get_schema_version(conn) < SCHEMA_VERSION:
+            apply_migrations(conn)
+            conn.execute("PRAGMA optimize")
+        return verify_database_profile(conn)
+
+# Latest closed month (YYYY-MM), or None while every period is open
+def get_closed_month(conn):
+    return conn.execute("SELECT MAX(month) FROM period_closes").fetchone()[0]
+
+# Refuse postings dated in a closed period
+def check_open_period(date, closed_month):
+    if closed_month is not None and str(date)[:7] <= closed_month:
+        raise ValueError(f"{date} falls in a closed period; the books are closed through {closed_month}")
+
+# Whether the archive table has been created, in whichever database holds it
+def archive_table_exists(conn):
+    return conn.execute(
+        f"SELECT 1 FROM {ARCHIVE_SCHEMA}.sqlite_master WHERE type = 'table' AND name = 'transactions_archive'"
+    ).fetchone() is not None
+
+# (table, last date read from it) pairs for the tables holding transactions, hot
+# table first. The archive is only read once a period has been archived and, given a
+# start date, only if it can hold rows on or after it. It is read up to the end of the
+# archived month, so rows a later, unfinished move has copied but not yet deleted from
+# the hot table are not seen twice. An archive database that is not attached
+# (CASH_CUSTODY_ARCHIVE_DB unset) is skipped.
+def transaction_tables(conn, start_date=None):
+    tables = [("main.transactions", None)]
+    archived_month = conn.execute("SELECT MAX(month) FROM period_closes WHERE archived = 1").fetchone()[0]
+    if archived_month is None or (start_date is not None and str(start_date) > month_end(archived_month)):
+        return tables
+    if archive_table_exists(conn):
+        tables.append((f"{ARCHIVE_SCHEMA}.transactions_archive", month_end(archived_month)))
+    return tables
+
+# FROM-clause source over the given transaction tables
+def transaction_source(tables):
+    if len(tables) == 1:
+        return tables[0][0]
+    return "(" + " UNION ALL ".join(
+        f"SELECT {ARCHIVE_COLUMNS} FROM {table}" + (f" WHERE date <= '{through}'" if through else "")
+        for table, through in tables
+    ) + ")"
+
+# Fetch all accounts
+def get_accounts():
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, name, balance FROM accounts")
+        accounts = cursor.fetchall()
+    return [{"id": row[0], "name": row[1], "balance": from_minor_units(row[2])} for row in accounts]
+
+# Compile transaction filters into parameterized WHERE conditions on the `t` alias.
+# Each predicate lines up with one of TRANSACTION_INDEXES; the amount range is
+# checked against the rows those indexes select.
+def transaction_filter_conditions(start_date=None, end_date=None, transaction_type=None, account_id=None,
+                                  from_account_id=None, to_account_id=None, min_amount=None, max_amount=None):
+    conditions, params = [], []
+    if start_date is not None:
+        conditions.append("t.date >= ?")
+        params.append(str(start_date))
+    if end_date is not None:
+        conditions.append("t.date <= ?")
+        params.append(str(end_date))
+    if transaction_type is not None:
+        conditions.append("t.type = ?")
+        params.append(transaction_type)
+    if account_id is not None:
+        conditions.append("(t.from_account_id = ? OR t.to_account_id = ?)")
+        params.extend([account_id, account_id])
+    if from_account_id is not None:
+        conditions.append("t.from_account_id = ?")
+        params.append(from_account_id)
+    if to_account_id is not None:
+        conditions.append("t.to_account_id = ?")
+        params.append(to_account_id)
+    if min_amount is not None:
+        conditions.append("t.amount >= ?")
+        params.append(to_minor_units(min_amount))
+    if max_amount is not None:
+        conditions.append("t.amount <= ?")
+        params.append(to_minor_units(max_amount))
+    return conditions, params
+
+# Conditions on the `t` alias plus the cut-off a transaction table is read up to
+def bounded_conditions(conditions, params, through):
+    if through is None:
+        return conditions, params
+    return [*conditions, "t.date <= ?"], [*params, through]
+
+# Count the transactions matching a set of filters, archived ones included
+def count_transactions(filters):
+    conditions, params = transaction_filter_conditions(**filters)
+    total = 0
+    with get_connection() as conn:
+        for table, through in transaction_tables(conn, filters.get("start_date")):
+            table_conditions, table_params = bounded_conditions(conditions, params, through)
+            query = f"SELECT COUNT(*) FROM {table} t"
+            if table_conditions:
+                query += " WHERE " + " AND ".join(table_conditions)
+            total += conn.execute(query, table_params).fetchone()[0]
+    return total
+
+# Count all transactions, archived ones included, and report the highest id. New
+# postings only ever go to the hot table, which holds the highest ids.
+def get_transaction_stats():
+    with get_connection() as conn:
+        total = 0
+        for table, through in transaction_tables(conn):
+            conditions, params = bounded_conditions([], [], through)
+            query = f"SELECT COUNT(*) FROM {table} t" + "".join(" WHERE " + c for c in conditions)
+            total += conn.execute(query, params).fetchone()[0]
+        high_water_mark = conn.execute("SELECT COALESCE(MAX(id), 0) FROM main.transactions").fetchone()[0]
+    return total, high_water_mark
+
+# Fetch one page of transactions
+def get_transactions_page(page_size=TRANSACTIONS_PAGE_SIZE, cursor=None, direction="next", filters=None):
+    """Fetch a page of transactions, newest first, using keyset pagination on (date, id).
+
+    ``cursor`` is the (date, id) key of the row the page starts after ("next") or
+    before ("prev"). ``filters`` holds transaction_filter_conditions() keyword
+    arguments and is applied in SQL. Archived periods are included. Returns the rows
+    plus the cursors of the neighbouring pages, which are None at either end of the
+    ledger.
+    """
+    filters = filters or {}
+    conditions, params = transaction_filter_conditions(**filters)
+    if cursor is not None:
+        conditions.append("(t.date, t.id) < (?, ?)" if direction == "next" else "(t.date, t.id) > (?, ?)")
+        params.extend(cursor)
+    order = " ORDER BY t.date DESC, t.id DESC" if direction == "next" else " ORDER BY t.date ASC, t.id ASC"
+
+    # Each table is paged along its own (date, id) index and the pages are merged
+    # here; paging a UNION ALL of the tables would sort every row of both
+    transactions = []
+    with get_connection() as conn:
+        for table, through in transaction_tables(conn, filters.get("start_date")):
+            table_conditions, table_params = bounded_conditions(conditions, params, through)
+            query = TRANSACTIONS_SELECT.format(source=table)
+            if table_conditions:
+                query += " WHERE " + " AND ".join(table_conditions)
+            transactions += conn.execute(query + order + " LIMIT ?", [*table_params, page_size + 1]).fetchall()
+    transactions.sort(key=lambda row: (row[1], row[0]), reverse=direction == "next")
+    transactions = transactions[:page_size + 1]
+
+    # The extra row only tells us whether another page exists beyond this one
+    has_more = len(transactions) > page_size
+    transactions = [(*row[:4], from_minor_units(row[4]), *row[5:]) for row in transactions[:page_size]]
+    if direction == "next":
+        has_newer, has_older = cursor is not None, has_more
+    else:
+        transactions.reverse()
+        has_newer, has_older = has_more, True
+    if not transactions:
+        return transactions, None, None
+    prev_cursor = (transactions[0][1], transactions[0][0]) if has_newer else None
+    next_cursor = (transactions[-1][1], transactions[-1][0]) if has_older else None
+    return transactions, prev_cursor, next_cursor
+
+# Balance of an account at the end of a given date
+def get_balance_as_of(account_id, as_of_date):
+    with get_connection() as conn:
+        row = conn.execute('''
+            SELECT COALESCE(
+                (SELECT balance FROM balance_ledger
+                 WHERE account_id = a.id AND date <= ?
+                 ORDER BY date DESC, transaction_id DESC, id DESC LIMIT 1),
+                a.opening_balance
+            )
+            FROM accounts a WHERE a.id = ?
+        ''', (str(as_of_date), account_id)).fetchone()
+    return from_minor_units(row[0]) if row else None
+
+# Running balance after every posting of an account, optionally within a date range
+def get_balance_history(account_id, start_date=None, end_date=None):
+    query = "SELECT date, transaction_id, amount, balance FROM balance_ledger WHERE account_id = ?"
+    params = [account_id]
+    if start_date is not None:
+        query += " AND date >= ?"
+        params.append(str(start_date))
+    if end_date is not None:
+        query += " AND date <= ?"
+        params.append(str(end_date))
+    query += " ORDER BY date, transaction_id, id"
+    with get_connection() as conn:
+        history = conn.execute(query, params).fetchall()
+    return [
+        {"date": row[0], "transaction_id": row[1], "amount": from_minor_units(row[2]), "balance": from_minor_units(row[3])}
+        for row in history
+    ]
+
+# Inflow, outflow and net movement per account over a date range, summed as integers in SQL
+def get_period_totals(start_date=None, end_date=None):
+    query = '''
+        SELECT a.name,
+               SUM(CASE WHEN l.amount > 0 THEN l.amount ELSE 0 END),
+               SUM(CASE WHEN l.amount < 0 THEN -l.amount ELSE 0 END),
+               SUM(l.amount)
+        FROM balance_ledger l JOIN accounts a ON a.id = l.account_id
+    '''
+    conditions, params = [], []
+    if start_date is not None:
+        conditions.append("l.date >= ?")
+        params.append(str(start_date))
+    if end_date is not None:
+        conditions.append("l.date <= ?")
+        params.append(str(end_date))
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " GROUP BY l.account_id ORDER BY a.name"
+    with get_connection() as conn:
+        totals = conn.execute(query, params).fetchall()
+    return [
+        {"account": row[0], "inflow": from_minor_units(row[1]), "outflow": from_minor_units(row[2]),
+         "net": from_minor_units(row[3])}
+        for row in totals
+    ]
+
+# Monthly inflow, outflow and net per account, read from the monthly summary table
+def get_monthly_summary(start_month=None, end_month=None, account_id=None):
+    query = '''
+        SELECT s.month, a.name, s.inflow, s.outflow, s.inflow - s.outflow, s.postings
+        FROM monthly_summary s JOIN accounts a ON a.id = s.account_id
+    '''
+    conditions, params = [], []
+    if start_month is not None:
+        conditions.append("s.month >= ?")
+        params.append(start_month)
+    if end_month is not None:
+        conditions.append("s.month <= ?")
+        params.append(end_month)
+    if account_id is not None:
+        conditions.append("s.account_id = ?")
+        params.append(account_id)
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY s.month, a.name"
+    with get_connection() as conn:
+        summary = conn.execute(query, params).fetchall()
+    return [
+        {"month": row[0], "account": row[1], "inflow": from_minor_units(row[2]), "outflow": from_minor_units(row[3]),
+         "net": from_minor_units(row[4]), "postings": row[5]}
+        for row in summary
+    ]
+
+# Daily totals per account and transaction type within one month
+def get_daily_summary(month, account_id=None):
+    query = '''
+        SELECT s.day, a.name, s.type, s.inflow, s.outflow, s.postings
+        FROM daily_summary s JOIN accounts a ON a.id = s.account_id
+        WHERE s.day >= ? AND s.day < ?
+    '''
+    # A month's days sort between "YYYY-MM" and "YYYY-MM~", so the range can use the key
+    params = [month, month + "~"]
+    if account_id is not None:
+        query += " AND s.account_id = ?"
+        params.append(account_id)
+    query += " ORDER BY s.day, a.name, s.type"
+    with get_connection() as conn:
+        summary = conn.execute(query, params).fetchall()
+    return [
+        {"day": row[0], "account": row[1], "type": row[2], "inflow": from_minor_units(row[3]),
+         "outflow": from_minor_units(row[4]), "postings": row[5]}
+        for row in summary
+    ]
+
+# Closed months, newest first
+def get_period_closes():
+    with get_connection() as conn:
+        closes = conn.execute(
+            "SELECT month, closed_at, archived FROM period_closes ORDER BY month DESC"
+        ).fetchall()
+    return [{"month": row[0], "closed_at": row[1], "archived": bool(row[2])} for row in closes]
+
+# Closing balance of every account at the end of a closed month
+def get_balance_snapshots(month):
+    with get_connection() as conn:
+        snapshots = conn.execute('''
+            SELECT a.name, s.closing_balance
+            FROM balance_snapshots s JOIN accounts a ON a.id = s.account_id
+            WHERE s.month = ?
+            ORDER BY a.name
+        ''', (month,)).fetchall()
+    return [{"account": row[0], "closing_balance": from_minor_units(row[1])} for row in snapshots]
+
+# Transactions with an id above the given high-water mark, in id order
+def get_transactions_since(last_id, limit):
+    with get_connection() as conn:
+        transactions = conn.execute(
+            TRANSACTIONS_SELECT.format(source="main.transactions") + " WHERE t.id > ? ORDER BY t.id LIMIT ?",
+            (last_id, limit),
+        ).fetchall()
+    return [(*row[:4], from_minor_units(row[4]), *row[5:]) for row in transactions]
+
+# Turn free text typed by a user into an FTS5 query. Every word must match, and the
+# last one also matches as a prefix so results appear while a word is being typed.
+# Words are quoted, so FTS5 operators and punctuation in the input are taken literally.
+def fts_query(text):
+    terms = ['"' + term.replace('"', '""') + '"' for term in text.split()]
+    if not terms:
+        return None
+    terms[-1] += "*"
+    return " ".join(terms)
+
+# Ranked full-text matches on transaction descriptions, best match first
+def search_transactions(text, page_size=SEARCH_PAGE_SIZE, page=0):
+    """Return (total_matches, rows) for one page of description search results.
+
+    Rows are ordered by bm25 relevance and carry a snippet of the description with
+    the matched words wrapped in SEARCH_HIGHLIGHT markers. Archived transactions
+    are searched through their own index.
+    """
+    query = fts_query(text)
+    if query is None:
+        return 0, []
+    with get_connection() as conn:
+        total, arms, arm_params = 0, [], []
+        for table, through in transaction_tables(conn):
+            schema, name = table.split(".")
+            fts = f"{name}_fts"
+            conditions, params = bounded_conditions([f"{fts} MATCH ?"], [query], through)
+            source = f"{schema}.{fts} JOIN {table} t ON t.id = {fts}.rowid WHERE " + " AND ".join(conditions)
+            total += conn.execute(f"SELECT COUNT(*) FROM {source}", params).fetchone()[0]
+            arms.append(f'''
+                SELECT t.id, t.date, t.type, snippet({fts}, 0, ?, ?, '…', ?) AS snippet, t.amount,
+                       t.from_account_id, t.to_account_id, t.file_path, {fts}.rank AS rank
+                FROM {source}
+            ''')
+            arm_params += [*SEARCH_HIGHLIGHT, SEARCH_SNIPPET_TOKENS, *params]
+        matches = conn.execute(f'''
+            SELECT m.id, m.date, m.type, m.snippet, m.amount, a1.name, a2.name, m.file_path
+            FROM ({" UNION ALL ".join(arms)} ORDER BY rank LIMIT ? OFFSET ?) m
+            LEFT JOIN accounts a1 ON m.from_account_id = a1.id
+            LEFT JOIN accounts a2 ON m.to_account_id = a2.id
+            ORDER BY m.rank
+        ''', (*arm_params, page_size, page * page_size)).fetchall()
+    return total, [(*row[:4], from_minor_units(row[4]), *row[5:]) for row in matches]
+
+# Cached readers, keyed on the data version
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES)
+def load_accounts(data_version):
+    return get_accounts()
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES)
+def load_transaction_stats(data_version):
+    return get_transaction_stats()
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES)
+def load_balance_as_of(data_version, account_id, as_of_date):
+    return get_balance_as_of(account_id, as_of_date)
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES)
+def load_balance_history(data_version, account_id, start_date=None, end_date=None):
+    return get_balance_history(account_id, start_date, end_date)
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES)
+def load_period_totals(data_version, start_date=None, end_date=None):
+    return get_period_totals(start_date, end_date)
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES)
+def load_monthly_summary(data_version, start_month=None, end_month=None, account_id=None):
+    return get_monthly_summary(start_month, end_month, account_id)
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES)
+def load_daily_summary(data_version, month, account_id=None):
+    return get_daily_summary(month, account_id)
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES)
+def load_period_closes(data_version):
+    return get_period_closes()
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES)
+def load_balance_snapshots(data_version, month):
+    return get_balance_snapshots(month)
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES)
+def load_transaction_count(data_version, filters):
+    return count_transactions(filters)
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES)
+def load_transactions_page(data_version, page_size, cursor=None, direction="next", filters=None):
+    return get_transactions_page(page_size, cursor, direction, filters)
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES)
+def load_search_results(data_version, text, page_size=SEARCH_PAGE_SIZE, page=0):
+    return search_transactions(text, page_size, page)
+
+# Column-pruned frame behind the dashboard: one row per transaction with a datetime
+# date, categorical type and amount in major units
+def get_analytics_frame():
+    with get_connection() as conn:
+        source = transaction_source(transaction_tables(conn))
+        frame = pd.read_sql_query(
+            f"SELECT date, type, description, amount, from_account_id, to_account_id FROM {source}",
+            conn,
+            dtype={"amount": "int64", "from_account_id": "Int64", "to_account_id": "Int64"},
+        )
+    frame["date"] = pd.to_datetime(frame["date"].str.slice(0, 10))
+    frame["type"] = frame["type"].astype(pd.CategoricalDtype(TRANSACTION_TYPES))
+    frame["amount"] = frame["amount"] / MINOR_UNITS
+    return frame
+
+# Keyed on the transactions version rather than the data version, since the frame
+# only changes when transactions do; only the newest couple of frames are kept since
+# each holds every transaction
+@st.cache_data(max_entries=DASHBOARD_CACHE_ENTRIES)
+def load_analytics_frame(transactions_version):
+    return get_analytics_frame()
+
+# Transactions version matching a data version. It is remembered for the session and
+# only read again once the data version has moved, so an idle rerun still reads the
+# database once.
+def session_transactions_version(data_version):
+    known = st.session_state.get("transactions_version")
+    if known is None or known[0] != data_version:
+        known = (data_version, current_transactions_version())
+        st.session_state["transactions_version"] = known
+    return known[1]
+
+# Cash in (deposits) and cash out (expenses) per period. Transfers move cash between
+# custodians and do not change the total held.
+def cash_flow_trend(frame, freq):
+    flows = frame[frame["type"].isin(["DEPOSIT", "EXPENSE"])]
+    trend = (
+        flows.groupby([pd.Grouper(key="date", freq=freq), "type"], observed=True)["amount"].sum()
+        .unstack("type")
+        .reindex(columns=["DEPOSIT", "EXPENSE"], fill_value=0)
+        .fillna(0)
+        .rename(columns={"DEPOSIT": "Cash In", "EXPENSE": "Cash Out"})
+    )
+    trend["Net"] = trend["Cash In"] - trend["Cash Out"]
+    return trend
+
+# Largest expense descriptions by total amount, grouping case and spacing variants
+def top_expense_descriptions(frame, limit=DASHBOARD_TOP_DESCRIPTIONS):
+    expenses = frame[frame["type"] == "EXPENSE"]
+    keys = expenses["description"].fillna("").str.strip().str.lower()
+    grouped = expenses.groupby(keys).agg(
+        description=("description", "first"), total=("amount", "sum"), count=("amount", "size")
+    )
+    top = grouped.nlargest(limit, "total").reset_index(drop=True)
+    top["description"] = top["description"].fillna("(no description)")
+    return top
+
+# Average daily spend per custodian account over the trailing window ending today and
+# how many days its current balance lasts at that rate
+def custodian_burn_rate(frame, accounts, days=DASHBOARD_BURN_DAYS):
+    if frame.empty or not accounts:
+        return pd.DataFrame(columns=["account", "spent", "daily_burn", "balance", "runway_days"])
+    today = pd.Timestamp.today().normalize()
+    window_start = today - pd.Timedelta(days=days - 1)
+    recent = frame[(frame["type"] == "EXPENSE") & frame["date"].between(window_start, today)]
+    spent = recent.groupby("from_account_id")["amount"].sum()
+    burn = pd.DataFrame(accounts).rename(columns={"name": "account"}).set_index("id")
+    burn["balance"] = burn["balance"].astype(float)
+    burn["spent"] = spent.reindex(burn.index, fill_value=0.0).to_numpy()
+    burn["daily_burn"] = burn["spent"] / days
+    burn["runway_days"] = (burn["balance"] / burn["daily_burn"]).where(burn["daily_burn"] > 0).round(1)
+    burn = burn.sort_values("daily_burn", ascending=False, ignore_index=True)
+    return burn[["account", "spent", "daily_burn", "balance", "runway_days"]]
+
+# Add a new account
+def add_account(name, balance):
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT INTO accounts (name, balance, opening_balance) VALUES (?, ?, ?)",
+            (name, to_minor_units(balance), to_minor_units(balance)),
+        )
+        bump_data_version(conn)
+        conn.commit()
+
+# Signed (account_id, amount) postings for a transaction tuple
+def transaction_postings(transaction_data):
+    transaction_type, amount = transaction_data[1], transaction_data[3]
+    signs = POSTING_SIGNS.get(transaction_type)
+    if signs is None:
+        return []
+    accounts = (transaction_data[4], transaction_data[5])
+    return [(account_id, sign * amount) for account_id, sign in zip(accounts, signs) if account_id]
+
+# Apply any number of postings to account balances. Postings are summed per account
+# first, then written with one grouped UPDATE per batch of accounts.
+def apply_postings(conn, postings):
+    deltas = {}
+    for account_id, amount in postings:
+        deltas[account_id] = deltas.get(account_id, 0) + amount
+    items = list(deltas.items())
+    for start in range(0, len(items), BALANCE_UPDATE_BATCH_SIZE):
+        batch = items[start:start + BALANCE_UPDATE_BATCH_SIZE]
+        values = ", ".join("(?, ?)" for _ in batch)
+        conn.execute(f'''
+            WITH deltas (account_id, amount) AS (VALUES {values})
+            UPDATE accounts SET balance = balance + (
+                SELECT amount FROM deltas WHERE deltas.account_id = accounts.id
+            )
+            WHERE id IN (SELECT account_id FROM deltas)
+        ''', [value for item in batch for value in item])
+
+# Insert one posting into the ledger, shifting the running balance of later postings.
+# Back-dated transactions are allowed, so the posting may land before existing rows.
+def post_to_ledger(cursor, transaction_id, account_id, date, amount):
+    cursor.execute(
+        "UPDATE balance_ledger SET balance = balance + ? WHERE account_id = ? AND date > ?",
+        (amount, account_id, date),
+    )
+    cursor.execute('''
+        SELECT COALESCE(
+            (SELECT balance FROM balance_ledger
+             WHERE account_id = a.id AND date <= ?
+             ORDER BY date DESC, transaction_id DESC, id DESC LIMIT 1),
+            a.opening_balance
+        )
+        FROM accounts a WHERE a.id = ?
+    ''', (date, account_id))
+    row = cursor.fetchone()
+    previous_balance = row[0] if row and row[0] is not None else 0
+    cursor.execute('''
+        INSERT INTO balance_ledger (transaction_id, account_id, date, amount, balance)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (transaction_id, account_id, date, amount, previous_balance + amount))
+
+# Add a new transaction
+def add_transaction(transaction_data, attachment=None):
+    """Add a new transaction and update account balances.
+
+    ``attachment`` is an optional (file object, original name, MIME type) upload. It
+    is stored in the same transaction as the posting, so a refused posting leaves no
+    attachments row behind. Returns the stored file path, if any.
+    """
+    transaction_data = (*transaction_data[:3], to_minor_units(transaction_data[3]), *transaction_data[4:])
+    attachment_id = None
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        # Check the period under the write lock, so a close committed by another
+        # process cannot slip in between the check and the insert
+        cursor.execute("BEGIN IMMEDIATE")
+        check_open_period(transaction_data[0], get_closed_month(conn))
+        if attachment is not None:
+            attachment_id, file_path = store_attachment(conn, *attachment)
+            transaction_data = (*transaction_data[:6], file_path)
+
+        # Insert the transaction into the database
+        cursor.execute('''
+            INSERT INTO transactions
+                (date, type, description, amount, from_account_id, to_account_id, file_path, attachment_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (*transaction_data, attachment_id))
+
+        # Update account balances and the running-balance ledger
+        transaction_id = cursor.lastrowid
+        transaction_date = transaction_data[0]
+        postings = transaction_postings(transaction_data)
+        apply_postings(cursor, postings)
+        for account_id, amount in postings:
+            post_to_ledger(cursor, transaction_id, account_id, transaction_date, amount)
+        apply_summary_postings(
+            cursor, [(account_id, transaction_date, transaction_data[1], amount) for account_id, amount in postings]
+        )
+        bump_data_version(conn, transactions=True)
+
+        conn.commit()
+    return transaction_data[6]
+
+# Normalize an import header ("From Account" or "from_account") to a field name
+def import_field_name(header):
+    return str(header or "").strip().lower().replace(" ", "_")
+
+# Read import rows as dicts from a CSV or Excel file object
+def read_import_file(file, filename):
+    if filename.lower().endswith((".xlsx", ".xlsm")):
+        workbook = load_workbook(file, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            headers = [import_field_name(header) for header in next(rows, [])]
+            for row in rows:
+                if any(value is not None for value in row):
+                    yield dict(zip(headers, row))
+        finally:
+            workbook.close()
+    else:
+        if isinstance(file, (str, os.PathLike)):
+            text = open(file, newline="", encoding="utf-8-sig")
+        else:
+            text = io.TextIOWrapper(file, newline="", encoding="utf-8-sig")
+        with text:
+            reader = csv.DictReader(text)
+            reader.fieldnames = [import_field_name(header) for header in reader.fieldnames or []]
+            yield from reader
+
+# Validate import rows and resolve account names. Returns the transaction tuples
+# ready for insertion and a list of "row N: problem" messages.
+def validate_import_rows(rows, account_ids, closed_month=None):
+    transactions, errors = [], []
+    for row_number, row in enumerate(rows, start=2):
+        problems = []
+        try:
+            value = row.get("date")
+            date = (value if isinstance(value, datetime) else datetime.fromisoformat(str(value).strip())).date()
+        except (TypeError, ValueError):
+            problems.append(f"invalid date {row.get('date')!r}")
+        else:
+            if closed_month is not None and date.isoformat()[:7] <= closed_month:
+                problems.append(f"date {date} is in a closed period")
+        transaction_type = str(row.get("type") or "").strip().upper()
+        if transaction_type not in POSTING_SIGNS:
+            problems.append(f"unknown type {row.get('type')!r}")
+        try:
+            amount = to_minor_units(row.get("amount"))
+            if amount < 0:
+                problems.append("amount must not be negative")
+        except (ArithmeticError, ValueError):
+            problems.append(f"invalid amount {row.get('amount')!r}")
+        resolved = []
+        for field in ("from_account", "to_account"):
+            name = str(row.get(field) or "").strip()
+            if name and name not in account_ids:
+                problems.append(f"unknown account {name!r}")
+            resolved.append(account_ids.get(name) if name else None)
+        if problems:
+            errors.append(f"row {row_number}: " + "; ".join(problems))
+            continue
+        description = row.get("description")
+        file_path = row.get("file_path") or None
+        transactions.append((
+            date.isoformat(), transaction_type, None if description is None else str(description),
+            amount, resolved[0], resolved[1], file_path,
+        ))
+    return transactions, errors
+
+# Bulk import transactions in a single database transaction
+def import_transactions(rows):
+    """Validate and insert many transactions at once.
+
+    Nothing is written if any row fails validation. Otherwise the rows are inserted
+    with executemany, account balances are updated with grouped UPDATEs, the balance
+    ledger is rebuilt for the touched accounts and the summaries are updated, all in
+    one commit. Returns (imported_count, errors).
+    """
+    with get_connection() as conn:
+        # Validate under the write lock, so the closed period and account names
+        # cannot change before the rows are written
+        conn.execute("BEGIN IMMEDIATE")
+        account_ids = dict(conn.execute("SELECT name, id FROM accounts"))
+        closed_month = get_closed_month(conn)
+        transactions, errors = validate_import_rows(rows, account_ids, closed_month)
+        if errors or not transactions:
+            conn.rollback()
+            return 0, errors
+
+        for start in range(0, len(transactions), IMPORT_BATCH_SIZE):
+            conn.executemany('''
+                INSERT INTO transactions (date, type, description, amount, from_account_id, to_account_id, file_path)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', transactions[start:start + IMPORT_BATCH_SIZE])
+
+        postings = [posting for row in transactions for posting in transaction_postings(row)]
+        apply_postings(conn, postings)
+        rebuild_balance_ledger(conn, {account_id for account_id, _ in postings}, closed_month)
+        apply_summary_postings(conn, [
+            (account_id, row[0], row[1], amount)
+            for row in transactions for account_id, amount in transaction_postings(row)
+        ])
+        bump_data_version(conn, transactions=True)
+        conn.commit()
+    return len(transactions), []
+
+# Move transactions dated up to the end of `month` into the archive table. In WAL mode
+# SQLite does not commit an attached database atomically with the main one, so the
+# move is two transactions that each write one file: the rows are copied and committed
+# to the archive first, and only rows the archive holds are then deleted from the hot
+# table. A move interrupted in between leaves the rows in both tables, where readers
+# only see the hot copy, and running the close again finishes it.
+def archive_transactions(conn, month):
+    through = month_end(month)
+    archive_table = f"{ARCHIVE_SCHEMA}.transactions_archive"
+    conn.execute("BEGIN IMMEDIATE")
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {archive_table} ({TABLE_SCHEMAS['transactions_archive']})")
+    conn.execute(
+        f"CREATE INDEX IF NOT EXISTS {ARCHIVE_SCHEMA}.idx_transactions_archive_date ON transactions_archive (date, id)"
+    )
+    conn.execute(ARCHIVE_FTS_SCHEMA)
+    conn.execute(f'''
+        INSERT OR IGNORE INTO {archive_table} ({ARCHIVE_COLUMNS})
+        SELECT {ARCHIVE_COLUMNS} FROM main.transactions WHERE date <= ?
+    ''', (through,))
+    first_id, last_id = conn.execute(
+        "SELECT MIN(id), MAX(id) FROM main.transactions WHERE date <= ?", (through,)
+    ).fetchone()
+    if first_id is not None:
+        index_descriptions(conn, archive_table, first_id, last_id)
+    conn.commit()
+
+    conn.execute("BEGIN IMMEDIATE")
+    archived = conn.execute(f'''
+        DELETE FROM main.transactions
+        WHERE date <= ? AND id IN (SELECT id FROM {ARCHIVE_SCHEMA}.transactions_archive WHERE date <= ?)
+    ''', (through, through)).rowcount
+    conn.execute("UPDATE period_closes SET archived = 1 WHERE month <= ?", (month,))
+    bump_data_version(conn)
+    conn.commit()
+    return archived
+
+# Close the books through a month
+def close_period(month, archive=False):
+    """Freeze every period up to and including ``month`` (YYYY-MM).
+
+    Each account's balance at the end of the month is written to balance_snapshots
+    and postings dated in a closed period are refused from then on. With ``archive``
+    the closed transactions then also move out of the hot table into
+    transactions_archive; an already closed month can be archived later the same way,
+    which also finishes an interrupted move. Balance ledger rows and summaries are
+    kept. Returns the number of transactions archived.
+    """
+    month = datetime.strptime(month, "%Y-%m").strftime("%Y-%m")
+    if month >= datetime.now().strftime("%Y-%m"):
+        raise ValueError("Only months that have ended can be closed")
+    with get_connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        closed_month = get_closed_month(conn)
+        if closed_month is None or month > closed_month:
+            conn.execute('''
+                INSERT INTO balance_snapshots (account_id, month, closing_balance)
+                SELECT a.id, ?, COALESCE(
+                    (SELECT balance FROM balance_ledger
+                     WHERE account_id = a.id AND date <= ?
+                     ORDER BY date DESC, transaction_id DESC, id DESC LIMIT 1),
+                    a.opening_balance
+                )
+                FROM accounts a
+            ''', (month, month_end(month)))
+            conn.execute(
+                "INSERT INTO period_closes (month, closed_at) VALUES (?, ?)",
+                (month, datetime.now().isoformat(timespec="seconds")),
+            )
+        elif not archive:
+            raise ValueError(f"The books are already closed through {closed_month}")
+        bump_data_version(conn)
+        conn.commit()
+        return archive_transactions(conn, month) if archive else 0
+
+# Delete all accounts, transactions and everything derived from them
+def reset_database():
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        # Cleared even when no month is marked archived: an interrupted first move
+        # leaves copied rows behind that no reader sees yet
+        if archive_table_exists(conn):
+            cursor.execute(f"DELETE FROM {ARCHIVE_SCHEMA}.transactions_archive")
+            cursor.execute(
+                f"INSERT INTO {ARCHIVE_SCHEMA}.transactions_archive_fts (transactions_archive_fts) VALUES ('delete-all')"
+            )
+        cursor.execute("DELETE FROM balance_snapshots")
+        cursor.execute("DELETE FROM period_closes")
+        cursor.execute("DELETE FROM balance_ledger")
+        cursor.execute("DELETE FROM daily_summary")
+        cursor.execute("DELETE FROM monthly_summary")
+        cursor.execute("DELETE FROM accounts")
+        cursor.execute("DELETE FROM transactions")
+        cursor.execute("DELETE FROM attachments")
+        # Transaction ids are never reused, not even across a reset: the Transactions
+        # panel tells new postings apart from the rows it already shows by id
+        cursor.execute("DELETE FROM sqlite_sequence WHERE name='accounts'")
+        bump_data_version(conn, transactions=True)
+        conn.commit()
+
+# Stream the transactions join in chunks, with the export filters pushed into SQL.
+# Archived periods are read from the archive table when the date range reaches them.
+def iter_export_chunks(**filters):
+    with get_connection() as conn:
+        source = transaction_source(transaction_tables(conn, filters.get("start_date")))
+        query = f'''
+            SELECT t.date, t.type, t.description, t.amount,
+                   a1.name AS from_account, a2.name AS to_account, t.file_path
+            FROM {source} t
+            LEFT JOIN accounts a1 ON t.from_account_id = a1.id
+            LEFT JOIN accounts a2 ON t.to_account_id = a2.id
+        '''
+        conditions, params = transaction_filter_conditions(**filters)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY t.date, t.id"
+
+        cursor = conn.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(EXPORT_CHUNK_SIZE)
+            if not rows:
+                break
+            yield [(*row[:3], from_minor_units(row[3]), *row[4:]) for row in rows]
+
+# Export transactions to Excel
+def export_transactions(excel_path, **filters):
+    """Stream the transactions join into a write-only workbook, one chunk of rows at a time."""
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Sheet1")
+    sheet.append(EXPORT_COLUMNS)
+    for rows in iter_export_chunks(**filters):
+        for row in rows:
+            sheet.append(row)
+    workbook.save(excel_path)
+
+# Export transactions to CSV
+def export_transactions_csv(csv_path, **filters):
+    with open(csv_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(EXPORT_COLUMNS)
+        for rows in iter_export_chunks(**filters):
+            writer.writerows(rows)
+
+# Export transactions to Parquet, one row group per chunk
+def export_transactions_parquet(parquet_path, **filters):
+    with pq.ParquetWriter(parquet_path, EXPORT_PARQUET_SCHEMA, compression="zstd") as writer:
+        for rows in iter_export_chunks(**filters):
+            columns = list(zip(*rows))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(columns, EXPORT_PARQUET_SCHEMA)],
+                schema=EXPORT_PARQUET_SCHEMA,
+            ))
+
+# Export transactions to gzipped JSON Lines
+def export_transactions_jsonl(jsonl_path, **filters):
+    with gzip.open(jsonl_path, "wt", encoding="utf-8") as f:
+        for rows in iter_export_chunks(**filters):
+            f.writelines(json.dumps(dict(zip(EXPORT_FIELDS, row)), ensure_ascii=False, default=float) + "\n" for row in rows)
+
+# Export format -> (writer, MIME type, download file name)
+EXPORT_FORMATS = {
+    "Excel": (export_transactions, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+              "transactions.xlsx"),
+    "CSV": (export_transactions_csv, "text/csv", "transactions.csv"),
+    "Parquet": (export_transactions_parquet, "application/vnd.apache.parquet", "transactions.parquet"),
+    "JSON Lines (gzip)": (export_transactions_jsonl, "application/gzip", "transactions.jsonl.gz"),
+}
+
+# Run an export writer into a temporary file of its own and return the file's bytes.
+# Sessions exporting at the same time never share a file, and the file is removed
+# once it has been read back.
+def export_bytes(export_writer, **filters):
+    with tempfile.NamedTemporaryFile(dir=UPLOAD_FOLDER, prefix=".export-", delete=False) as temp:
+        export_path = temp.name
+    try:
+        export_writer(export_path, **filters)
+        with open(export_path, "rb") as f:
+            return f.read()
+    finally:
+        os.remove(export_path)
+
+# Build the File Link column with vectorized string operations instead of a per-row
+# os.path.abspath call. Stored paths are relative to the working directory.
+def file_link_column(file_paths):
+    file_paths = file_paths.fillna("").astype(str)
+    absolute_paths = file_paths.where(
+        file_paths.str.startswith(os.sep),
+        os.getcwd() + os.sep + file_paths.str.removeprefix("." + os.sep),
+    )
+    links = '<a href="file:///' + absolute_paths + '" target="_blank">📂 Open File</a>'
+    # Compressed blobs cannot be opened from disk; they are served by the download control
+    links = links.where(~file_paths.str.endswith(tuple(ATTACHMENT_ENCODINGS.values())), "🗜️ Use Download Attachment")
+    return links.where(file_paths != "", "No File")
+
+# Build the Transactions panel frame from query rows
+def transactions_frame(transactions):
+    df_transactions = pd.DataFrame(transactions, columns=TRANSACTION_COLUMNS)
+    df_transactions["File Link"] = file_link_column(df_transactions["File Path"])
+    return df_transactions
+
+# Refresh the newest page kept in session state with only the rows posted since it was
+# loaded. Returns None when the page cannot be patched and must be reloaded instead.
+def refresh_newest_page(view, total, page_size):
+    new_transactions = get_transactions_since(view["high_water_mark"], page_size + 1)
+    # Ids are never reused and the total counts archived rows too, so anything other
+    # than inserts or moves to the archive (a reset, or more rows than fit on the page)
+    # shows up as a count mismatch or an overflow
+    if len(new_transactions) > page_size or view["total"] + len(new_transactions) != total:
+        return None
+    if not new_transactions:
+        return view["frame"], view["cursors"][1]
+    df_transactions = pd.concat([transactions_frame(new_transactions), view["frame"]], ignore_index=True)
+    df_transactions = df_transactions.sort_values(["Date", "ID"], ascending=False, ignore_index=True)
+    df_transactions = df_transactions.head(page_size)
+    next_cursor = None
+    if total > len(df_transactions):
+        last = df_transactions.iloc[-1]
+        next_cursor = (last["Date"], int(last["ID"]))
+    return df_transactions, next_cursor
+
+# Render the current page of the Transactions panel
+def render_transactions(data_version):
+    total, high_water_mark = load_transaction_stats(data_version)
+    filters = st.session_state.get("transactions_filters", {})
+    if filters and total:
+        total = load_transaction_count(data_version, filters)
+    if not total:
+        st.session_state["transactions_cursors"] = (None, None)
+        st.session_state.pop("transactions_view", None)
+        st.write("No transactions match the filters." if filters else "No transactions available.")
+        return
+    page_size = st.session_state.get("transactions_page_size", TRANSACTIONS_PAGE_SIZE)
+    cursor, direction = st.session_state.get("transactions_page", (None, "next"))
+    page_key = (page_size, cursor, direction, tuple(filters.items()))
+    view = st.session_state.get("transactions_view")
+
+    refreshed = None
+    if view is not None and view["page"] == page_key:
+        if view["data_version"] == data_version:
+            refreshed = view["frame"], view["cursors"][1]
+        elif cursor is None and not filters:
+            # New rows may not match the filters, so only the unfiltered view is patched
+            refreshed = refresh_newest_page(view, total, page_size)
+    if refreshed is not None:
+        df_transactions, next_cursor = refreshed
+        prev_cursor = view["cursors"][0]
+    else:
+        transactions, prev_cursor, next_cursor = load_transactions_page(
+            data_version, page_size, cursor, direction, filters
+        )
+        if not transactions and cursor is not None:
+            # The page we were on no longer exists; fall back to the newest entries
+            st.session_state["transactions_page"] = (None, "next")
+            page_key = (page_size, None, "next", tuple(filters.items()))
+            transactions, prev_cursor, next_cursor = load_transactions_page(
+                data_version, page_size, filters=filters
+            )
+        df_transactions = transactions_frame(transactions)
+
+    st.session_state["transactions_cursors"] = (prev_cursor, next_cursor)
+    st.session_state["transactions_view"] = {
+        "page": page_key,
+        "data_version": data_version,
+        "frame": df_transactions,
+        "high_water_mark": high_water_mark,
+        "total": total,
+        "cursors": (prev_cursor, next_cursor),
+    }
+    # Previews are looked up at display time so ones finished in the background show
+    # up without invalidating the cached page
+    st.dataframe(
+        df_transactions.assign(Preview=preview_column(df_transactions["File Path"])),
+        column_config={"Preview": st.column_config.ImageColumn("Preview")},
+    )
+    st.caption(f"Showing {len(df_transactions)} of {total} transactions")
+
+# Balance as of date and period totals. Runs as a fragment so picking an account or
+# a date only reruns these expanders.
+@st.fragment
+def render_balance_panels(accounts, data_version):
+    data_version = fragment_data_version(data_version)
+    with st.expander("Balance as of date"):
+        if accounts:
+            account_names = {acc["name"]: acc["id"] for acc in accounts}
+            name_col, date_col = st.columns(2)
+            balance_account = name_col.selectbox("Account", list(account_names), key="balance_account")
+            balance_date = date_col.date_input("As of", key="balance_date")
+            balance_account_id = account_names[balance_account]
+            st.metric("Balance", f"{load_balance_as_of(data_version, balance_account_id, balance_date):,.2f}")
+            history = load_balance_history(data_version, balance_account_id, end_date=balance_date)
+            if history:
+                st.line_chart(pd.DataFrame(history).astype({"balance": float}), x="date", y="balance")
+        else:
+            st.write("No accounts available.")
+
+    with st.expander("Period totals"):
+        totals_range = st.date_input("Period", value=(), key="totals_range")
+        totals = load_period_totals(data_version, *(totals_range if len(totals_range) == 2 else ()))
+        if totals:
+            st.dataframe(pd.DataFrame(totals))
+        else:
+            st.write("No postings in this period.")
+
+# Monthly and daily totals read straight from the summary tables. Runs as a fragment
+# so choosing an account or a month only reruns this panel.
+@st.fragment
+def render_summary_panel(accounts, data_version):
+    data_version = fragment_data_version(data_version)
+    account_ids = {acc["name"]: acc["id"] for acc in accounts}
+    account_col, range_col = st.columns(2)
+    summary_account = account_col.selectbox("Account", [None] + list(account_ids), key="summary_account",
+                                            format_func=lambda name: "All accounts" if name is None else name)
+    summary_range = range_col.date_input("Months", value=(), key="summary_range")
+    months = [day.strftime("%Y-%m") for day in summary_range] if len(summary_range) == 2 else []
+    summary = load_monthly_summary(data_version, *months, account_id=account_ids.get(summary_account))
+    if not summary:
+        st.write("No postings to summarize.")
+        return
+    df_summary = pd.DataFrame(summary)
+    # Net movement per month (rows) and account (columns)
+    st.dataframe(df_summary.pivot_table(index="month", columns="account", values="net", aggfunc="sum").astype(float))
+    with st.expander("Monthly totals"):
+        st.dataframe(df_summary)
+    with st.expander("Daily totals by type"):
+        summary_month = st.selectbox("Month", df_summary["month"].unique()[::-1].tolist(), key="summary_month")
+        daily = load_daily_summary(data_version, summary_month, account_ids.get(summary_account))
+        st.dataframe(pd.DataFrame(daily))
+
+# Closed months and their closing balances
+@st.fragment
+def render_closed_periods(data_version):
+    data_version = fragment_data_version(data_version)
+    closes = load_period_closes(data_version)
+    if not closes:
+        return
+    with st.expander(f"Closed periods (through {closes[0]['month']})"):
+        st.dataframe(pd.DataFrame(closes))
+        snapshot_month = st.selectbox("Closing balances for", [close["month"] for close in closes],
+                                      key="snapshot_month")
+        st.dataframe(pd.DataFrame(load_balance_snapshots(data_version, snapshot_month)))
+
+# Management dashboard. Runs as a fragment so switching the granularity only reruns
+# the charts, which are computed from the cached analytics frame.
+@st.fragment
+def render_dashboard(data_version):
+    data_version = fragment_data_version(data_version)
+    frame = load_analytics_frame(session_transactions_version(data_version))
+    if frame.empty:
+        st.write("No transactions available.")
+        return
+    accounts = load_accounts(data_version)
+
+    st.subheader("Cash In / Cash Out")
+    granularity = st.radio("Granularity", list(DASHBOARD_FREQUENCIES), horizontal=True, key="dashboard_granularity")
+    trend = cash_flow_trend(frame, DASHBOARD_FREQUENCIES[granularity])
+    st.line_chart(trend[["Cash In", "Cash Out"]])
+    st.bar_chart(trend["Net"])
+
+    st.subheader("Top Expense Descriptions")
+    top_expenses = top_expense_descriptions(frame)
+    if top_expenses.empty:
+        st.write("No expenses recorded.")
+    else:
+        st.bar_chart(top_expenses, x="description", y="total", horizontal=True)
+        st.dataframe(top_expenses)
+
+    st.subheader(f"Custodian Burn Rate (last {DASHBOARD_BURN_DAYS} days)")
+    st.dataframe(custodian_burn_rate(frame, accounts))
+
+# Export controls. Runs as a fragment inside the sidebar so changing the format or a
+# filter does not rerun the whole page.
+@st.fragment
+def render_export_panel(accounts):
+    export_format = st.selectbox("Format", list(EXPORT_FORMATS))
+    export_range = st.date_input("Date Range", value=(), key="export_range")
+    export_account = st.selectbox("Account", [None] + [acc["name"] for acc in accounts], key="export_account")
+    export_type = st.selectbox("Transaction Type", [None] + TRANSACTION_TYPES, key="export_type")
+    if st.button("Export Transactions"):
+        export_filters = {
+            "account_id": next((acc["id"] for acc in accounts if acc["name"] == export_account), None),
+            "transaction_type": export_type,
+        }
+        if len(export_range) == 2:
+            export_filters["start_date"], export_filters["end_date"] = export_range
+        export_writer, export_mime, export_file_name = EXPORT_FORMATS[export_format]
+        st.download_button(
+            label=f"Download {export_format} File",
+            data=export_bytes(export_writer, **export_filters),
+            file_name=export_file_name,
+            mime=export_mime,
+        )
+
+# Download the attachment of a transaction on the current page. The stored blob may
+# be compressed, so it is decompressed here rather than linked from disk.
+@st.fragment
+def render_attachment_download():
+    view = st.session_state.get("transactions_view")
+    if not view:
+        return
+    frame = view["frame"]
+    attachment_ids = frame.loc[frame["File Path"].fillna("") != "", "ID"].astype(int).tolist()
+    if not attachment_ids:
+        return
+    with st.expander("Download Attachment"):
+        transaction_id = st.selectbox("Transaction ID", attachment_ids, key="attachment_transaction_id")
+        if st.button("Fetch Attachment"):
+            attachment = read_transaction_attachment(transaction_id)
+            if attachment is None:
+                st.warning("This transaction has no attachment.")
+                return
+            original_name, mime_type, data = attachment
+            st.download_button(
+                label=f"Download {original_name}",
+                data=data,
+                file_name=original_name or f"transaction-{transaction_id}",
+                mime=mime_type or "application/octet-stream",
+            )
+
+# Search box over transaction descriptions. Runs as a fragment so typing a query or
+# paging through results does not rerun the rest of the page.
+@st.fragment
+def render_transaction_search(data_version):
+    text = st.text_input("Search descriptions", key="search_text", on_change=reset_search_page)
+    if not text.strip():
+        return
+    page = st.session_state.get("search_page", 0)
+    total, matches = load_search_results(fragment_data_version(data_version), text, SEARCH_PAGE_SIZE, page)
+    if not matches:
+        st.write("No matching transactions.")
+        return
+    start, end = SEARCH_HIGHLIGHT
+    for transaction_id, date, transaction_type, snippet, amount, from_account, to_account, _ in matches:
+        snippet = markdown_text(snippet).replace(start, "<mark>").replace(end, "</mark>")
+        accounts = " → ".join(markdown_text(name) for name in (from_account, to_account) if name)
+        st.markdown(
+            f"**#{transaction_id}** · {date} · {transaction_type} · {amount:,.2f}"
+            f" · {accounts}<br>{snippet}",
+            unsafe_allow_html=True,
+        )
+    first = page * SEARCH_PAGE_SIZE + 1
+    st.caption(f"Matches {first}–{first + len(matches) - 1} of {total}")
+    prev_col, next_col = st.columns(2)
+    prev_col.button("◀ Previous matches", on_click=change_search_page, args=(-1,), disabled=page == 0)
+    next_col.button("More matches ▶", on_click=change_search_page, args=(1,),
+                    disabled=first + len(matches) > total)
+
+# Description text made safe to place inside st.markdown with unsafe_allow_html
+def markdown_text(value):
+    return html.escape(value or "", quote=False).translate(MARKDOWN_ESCAPES)
+
+def reset_search_page():
+    st.session_state["search_page"] = 0
+
+def change_search_page(step):
+    st.session_state["search_page"] = max(st.session_state.get("search_page", 0) + step, 0)
+
+# Filter bar for the Transactions panel. The chosen values are kept in session state
+# as transaction_filter_conditions() arguments; empty fields are left out.
+def render_transaction_filters(accounts):
+    account_ids = {acc["name"]: acc["id"] for acc in accounts}
+    with st.expander("Filters", expanded=bool(st.session_state.get("transactions_filters"))):
+        with st.form("transactions_filter_form"):
+            date_col, type_col = st.columns(2)
+            filter_range = date_col.date_input("Date Range", value=(), key="filter_range")
+            filter_type = type_col.selectbox("Transaction Type", [None] + TRANSACTION_TYPES, key="filter_type")
+            from_col, to_col = st.columns(2)
+            filter_from = from_col.selectbox("From Account", [None] + list(account_ids), key="filter_from_account")
+            filter_to = to_col.selectbox("To Account", [None] + list(account_ids), key="filter_to_account")
+            min_col, max_col = st.columns(2)
+            filter_min = min_col.number_input("Min Amount", min_value=0.0, value=None, key="filter_min_amount")
+            filter_max = max_col.number_input("Max Amount", min_value=0.0, value=None, key="filter_max_amount")
+            apply_col, clear_col = st.columns(2)
+            apply_filters = apply_col.form_submit_button("Apply Filters")
+            clear_col.form_submit_button("Clear Filters", on_click=clear_transaction_filters)
+    if apply_filters:
+        filters = {
+            "transaction_type": filter_type,
+            "from_account_id": account_ids.get(filter_from),
+            "to_account_id": account_ids.get(filter_to),
+            "min_amount": filter_min,
+            "max_amount": filter_max,
+        }
+        if len(filter_range) == 2:
+            filters["start_date"], filters["end_date"] = (str(day) for day in filter_range)
+        st.session_state["transactions_filters"] = {key: value for key, value in filters.items() if value is not None}
+        reset_transactions_page()
+
+# Save the transaction entered in the sidebar form. Runs as the submit callback, ahead
+# of the rerun, so the form is only emptied once the transaction is saved and the
+# clerk's input stays in place when it is refused.
+def submit_transaction(accounts):
+    state = st.session_state
+    account_ids = {acc["name"]: acc["id"] for acc in accounts}
+    uploaded_file = state.get("transaction_file")
+    attachment = (uploaded_file, uploaded_file.name, uploaded_file.type) if uploaded_file else None
+    try:
+        file_path = add_transaction((
+            state["transaction_date"], state["transaction_type"], state["transaction_desc"],
+            state["transaction_amount"], account_ids.get(state["transaction_from_account"]),
+            account_ids.get(state["transaction_to_account"]), None,
+        ), attachment)
+    except ValueError as e:
+        state["add_transaction_result"] = (False, str(e))
+        return
+    if uploaded_file:
+        schedule_preview(file_path, uploaded_file.type or mimetypes.guess_type(uploaded_file.name)[0])
+    for key in ADD_TRANSACTION_WIDGETS:
+        state.pop(key, None)
+    state["add_transaction_result"] = (True, "Transaction added successfully!")
+
+# Drop the applied filters and empty the filter form
+def clear_transaction_filters():
+    for key in TRANSACTION_FILTER_WIDGETS:
+        st.session_state.pop(key, None)
+    st.session_state["transactions_filters"] = {}
+    reset_transactions_page()
+
+# Move the Transactions panel to a neighbouring page. The cursors are read when the
+# button callback fires so they always belong to the most recently rendered page.
+def change_transactions_page(direction):
+    prev_cursor, next_cursor = st.session_state.get("transactions_cursors", (None, None))
+    cursor = prev_cursor if direction == "prev" else next_cursor
+    if cursor is not None:
+        st.session_state["transactions_page"] = (cursor, direction)
+
+def reset_transactions_page():
+    st.session_state["transactions_page"] = (None, "next")
+
+# Reset the application. Returns the data version to render the rest of the page with.
+def reset_application(data_version):
+    if st.session_state.get("confirm_reset", False):
+        reset_database()
+        st.success("Application reset successfully!")
+        st.session_state["confirm_reset"] = False
+        data_version = current_data_version()
+        # Refresh accounts and transactions dynamically
+        with accounts_placeholder.container():
+            accounts = load_accounts(data_version)
+            st.dataframe(pd.DataFrame(accounts))
+        st.session_state["transactions_page"] = (None, "next")
+        with transactions_placeholder.container():
+            render_transactions(data_version)
+    else:
+        st.session_state["confirm_reset"] = st.sidebar.button("Confirm Reset")
+        if st.session_state["confirm_reset"]:
+            st.warning("Are you sure you want to reset the application? This action cannot be undone.")
+    return data_version
+
+# Schema setup runs once per server process; later reruns reuse the cached result
+@st.cache_resource
+def setup_database():
+    return init_database()
+
+# Command line entry point:
+#   python streamlit-Cash-Custody-app.py import <file.csv|file.xlsx>
+#   python streamlit-Cash-Custody-app.py close <YYYY-MM> [--archive]
+def main(argv):
+    parser = argparse.ArgumentParser(description=APP_TITLE)
+    commands = parser.add_subparsers(dest="command", required=True)
+    import_parser = commands.add_parser("import", help="bulk import transactions from a CSV or Excel file")
+    import_parser.add_argument("path")
+    close_parser = commands.add_parser("close", help="close the books through a month (YYYY-MM)")
+    close_parser.add_argument("month")
+    close_parser.add_argument("--archive", action="store_true", help="move closed transactions to the archive")
+    args = parser.parse_args(argv)
+
+    if args.command == "close":
+        try:
+            archived = close_period(args.month, archive=args.archive)
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            return 1
+        print(f"Books closed through {args.month}; {archived} transaction(s) archived.")
+        return 0
+
+    imported, errors = import_transactions(read_import_file(args.path, args.path))
+    for error in errors:
+        print(error, file=sys.stderr)
+    if errors:
+        print(f"Import aborted: {len(errors)} invalid row(s), nothing was written.", file=sys.stderr)
+        return 1
+    print(f"Imported {imported} transaction(s).")
+    return 0
+
+# Initialize the database before starting the app
+database_profile_issues = setup_database()
+
+# Outside `streamlit run` the script acts as a command line tool
+if __name__ == "__main__" and not runtime.exists():
+    sys.exit(main(sys.argv[1:]))
+
+# Streamlit UI
+st.title(APP_TITLE)
+st.sidebar.header("Actions")
+st.markdown(f"### {CREDITS}")
+for issue in database_profile_issues:
+    st.warning(f"Database performance profile not applied: {issue}")
+
+# Add custom CSS for headers and sidebar sections
+st.markdown(
+    """
+    <style>
+    .header {
+        background-color: #4CAF50;
+        color: white;
+        padding: 10px;
+        border-radius: 5px;
+    }
+    .sidebar-section {
+        background-color: #f0f0f0;
+        padding: 10px;
+        border-radius: 5px;
+        margin-bottom: 10px;
+    }
+    </style>
+    """,
+    unsafe_allow_html=True,
+)
+
+# Read once per run; the writes below read it again after they commit
+data_version = current_data_version()
+
+# Enhanced UI Example
+accounts_tab, transactions_tab, dashboard_tab = st.tabs(["Accounts", "Transactions", "Dashboard"])
+
+with accounts_tab:
+    st.markdown('<div class="header"><h2>Accounts</h2></div>', unsafe_allow_html=True)
+    accounts_placeholder = st.empty()
+    with accounts_placeholder.container():
+        accounts = load_accounts(data_version)
+        st.dataframe(pd.DataFrame(accounts))
+
+    render_balance_panels(accounts, data_version)
+
+    st.markdown('<div class="header"><h2>Summary</h2></div>', unsafe_allow_html=True)
+    render_summary_panel(accounts, data_version)
+    render_closed_periods(data_version)
+
+with transactions_tab:
+    st.markdown('<div class="header"><h2>Transactions</h2></div>', unsafe_allow_html=True)
+    render_transaction_filters(accounts)
+    transactions_placeholder = st.empty()
+    with transactions_placeholder.container():
+        render_transactions(data_version)
+    newer_col, older_col, size_col = st.columns([1, 1, 2])
+    newer_col.button("◀ Newer", on_click=change_transactions_page, args=("prev",),
+                     disabled=st.session_state["transactions_cursors"][0] is None)
+    older_col.button("Older ▶", on_click=change_transactions_page, args=("next",),
+                     disabled=st.session_state["transactions_cursors"][1] is None)
+    size_col.selectbox("Rows per page", PAGE_SIZE_OPTIONS, key="transactions_page_size",
+                       index=PAGE_SIZE_OPTIONS.index(TRANSACTIONS_PAGE_SIZE), on_change=reset_transactions_page)
+    render_attachment_download()
+    render_transaction_search(data_version)
+
+# Add account
+st.sidebar.markdown('<div class="sidebar-section"><h3>Add Account</h3></div>', unsafe_allow_html=True)
+# Form widgets only send their values on submit, so typing does not rerun the page
+with st.sidebar.form("add_account_form", clear_on_submit=True):
+    account_name = st.text_input("Account Name")
+    account_balance = st.number_input("Initial Balance", min_value=0.0)
+    add_account_submitted = st.form_submit_button("Add Account")
+if add_account_submitted:
+    add_account(account_name, account_balance)
+    st.success(f"Account '{account_name}' added successfully!")
+    data_version = current_data_version()
+    # Refresh accounts dynamically
+    with accounts_placeholder.container():
+        accounts = load_accounts(data_version)
+        st.dataframe(pd.DataFrame(accounts))
+
+# Add transaction
+st.sidebar.markdown('<div class="sidebar-section"><h3>Add Transaction</h3></div>', unsafe_allow_html=True)
+with st.sidebar.form("add_transaction_form"):
+    st.date_input("Date", key="transaction_date")
+    st.selectbox("Type", TRANSACTION_TYPES, key="transaction_type")
+    st.text_input("Description", key="transaction_desc")
+    st.number_input("Amount", min_value=0.0, key="transaction_amount")
+    st.selectbox("From Account", [None] + [acc["name"] for acc in accounts], key="transaction_from_account")
+    st.selectbox("To Account", [None] + [acc["name"] for acc in accounts], key="transaction_to_account")
+    st.file_uploader("Upload File", key="transaction_file")
+    st.form_submit_button("Add Transaction", on_click=submit_transaction, args=(accounts,))
+add_transaction_result = st.session_state.pop("add_transaction_result", None)
+if add_transaction_result is not None:
+    add_transaction_succeeded, add_transaction_message = add_transaction_result
+    (st.success if add_transaction_succeeded else st.error)(add_transaction_message)
+
+# Bulk import
+st.sidebar.markdown('<div class="sidebar-section"><h3>Import Transactions</h3></div>', unsafe_allow_html=True)
+with st.sidebar.form("import_form", clear_on_submit=True):
+    import_file = st.file_uploader("CSV or Excel File", type=["csv", "xlsx"], key="import_file")
+    import_submitted = st.form_submit_button("Import Transactions")
+if import_submitted and import_file:
+    imported, import_errors = import_transactions(read_import_file(import_file, import_file.name))
+    if import_errors:
+        st.error(f"Import aborted: {len(import_errors)} invalid row(s), nothing was written.")
+        st.code("\n".join(import_errors[:50]))
+    else:
+        st.success(f"Imported {imported} transaction(s) successfully!")
+        data_version = current_data_version()
+        with accounts_placeholder.container():
+            accounts = load_accounts(data_version)
+            st.dataframe(pd.DataFrame(accounts))
+        with transactions_placeholder.container():
+            render_transactions(data_version)
+
+# Period close
+st.sidebar.markdown('<div class="sidebar-section"><h3>Close Period</h3></div>', unsafe_allow_html=True)
+with st.sidebar.form("close_period_form"):
+    close_date = st.date_input("Close Books Through", value=datetime.now().date().replace(day=1) - timedelta(days=1),
+                               help="Closes every month up to and including the month of this date")
+    close_archive = st.checkbox("Archive closed transactions")
+    close_submitted = st.form_submit_button("Close Period")
+if close_submitted:
+    try:
+        archived = close_period(close_date.strftime("%Y-%m"), archive=close_archive)
+    except ValueError as e:
+        st.sidebar.error(str(e))
+    else:
+        st.sidebar.success(f"Books closed through {close_date:%Y-%m}; {archived} transaction(s) archived.")
+        data_version = current_data_version()
+        with transactions_placeholder.container():
+            render_transactions(data_version)
+
+# Reset button
+st.sidebar.markdown('<div class="sidebar-section"><h3>Reset Application</h3></div>', unsafe_allow_html=True)
+data_version = reset_application(data_version)
+
+# Export transactions
+st.sidebar.markdown('<div class="sidebar-section"><h3>Export Transactions</h3></div>', unsafe_allow_html=True)
+with st.sidebar:
+    render_export_panel(accounts)
+
+# The dashboard is drawn last so it reflects any write made by the sidebar above
+with dashboard_tab:
+    render_dashboard(data_version)
@@ -0,0 +1,111 @@
+import importlib.util
+import os
+import sqlite3
+from contextlib import contextmanager
+from pathlib import Path
+
+import pytest
+import streamlit as st
+
+APP_PATH = Path(__file__).resolve().parents[1] / "streamlit-Cash-Custody-app.py"
+
+
+def clear_streamlit_caches():
+    st.cache_resource.clear()
+    st.cache_data.clear()
+
+
+# The app is a single Streamlit script. Importing it outside `streamlit run` sets up
+# the database under the working directory and renders the UI in bare mode.
+def load_app():
+    clear_streamlit_caches()
+    spec = importlib.util.spec_from_file_location("cash_custody_app", APP_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("data", exist_ok=True)
+    return tmp_path
+
+
+@pytest.fixture
+def app_loader(workdir):
+    loaded = []
+
+    def load():
+        module = load_app()
+        loaded.append(module)
+        return module
+
+    yield load
+    for module in loaded:
+        module.get_connection_pool().close_all()
+    clear_streamlit_caches()
+
+
+@pytest.fixture
+def app(app_loader):
+    return app_loader()
+
+
+# Database file the app under test writes to
+@pytest.fixture
+def db(app):
+    conn = sqlite3.connect(app.DB_FILENAME)
+    yield conn
+    conn.close()
+
+
+# SQL statements run on pooled connections while the returned list is being filled.
+# The pool hands out its most recently released connection, so tracing every idle
+# connection catches the statements of the next call.
+@pytest.fixture
+def traced_sql(app):
+    statements = []
+    pool = app.get_connection_pool()
+    conn = pool.acquire()
+    pool.release(conn)
+    conn.set_trace_callback(statements.append)
+    yield statements
+    conn.set_trace_callback(None)
+
+
+def create_account(app, name, balance=0):
+    app.add_account(name, balance)
+    return next(account["id"] for account in app.get_accounts() if account["name"] == name)
+
+
+def balances(app):
+    return {account["name"]: account["balance"] for account in app.get_accounts()}
+
+
+def ledger_rows(db):
+    return db.execute(
+        "SELECT transaction_id, account_id, date, amount, balance FROM balance_ledger "
+        "ORDER BY account_id, date, transaction_id"
+    ).fetchall()
+
+
+# Make `module.name` die on its `call_number`-th call, as if the process were killed
+# there, and expect the block to be interrupted. The original is put back afterwards.
+@contextmanager
+def interrupted_on_call(monkeypatch, module, name, call_number):
+    original = getattr(module, name)
+    calls = []
+
+    def interrupted(*args, **kwargs):
+        calls.append(args)
+        if len(calls) == call_number:
+            raise KeyboardInterrupt
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(module, name, interrupted)
+    try:
+        with pytest.raises(KeyboardInterrupt):
+            yield
+    finally:
+        monkeypatch.setattr(module, name, original)
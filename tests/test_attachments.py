@@ -0,0 +1,60 @@
+import datetime
+import io
+import os
+
+import pytest
+
+from conftest import create_account
+
+
+def post_with_attachment(app, account_id, content, name):
+    return app.add_transaction(
+        (datetime.date(2024, 1, 1), "EXPENSE", name, 1, account_id, None, None),
+        (io.BytesIO(content), name, None),
+    )
+
+
+def stored_files(app):
+    return sorted(
+        os.path.join(root, name) for root, _, names in os.walk(app.ATTACHMENT_FOLDER) for name in names
+    )
+
+
+def test_identical_uploads_share_one_blob(app, db):
+    a = create_account(app, "A", 10)
+    first = post_with_attachment(app, a, b"receipt 42", "receipt.txt")
+    second = post_with_attachment(app, a, b"receipt 42", "copy of receipt.txt")
+    other = post_with_attachment(app, a, b"receipt 43", "other.txt")
+
+    assert first == second != other
+    assert db.execute("SELECT COUNT(*) FROM attachments").fetchone()[0] == 2
+    assert db.execute("SELECT COUNT(DISTINCT attachment_id) FROM transactions").fetchone()[0] == 2
+    assert stored_files(app) == sorted([first, other])
+
+
+def test_upload_over_the_size_limit_is_refused(app, db, monkeypatch):
+    a = create_account(app, "A", 10)
+    monkeypatch.setattr(app, "ATTACHMENT_CHUNK_SIZE", 4)
+    monkeypatch.setattr(app, "ATTACHMENT_MAX_SIZE", 10)
+    post_with_attachment(app, a, b"0123456789", "fits.txt")
+
+    with pytest.raises(ValueError, match="upload limit"):
+        post_with_attachment(app, a, b"0123456789a", "too big.txt")
+    assert db.execute("SELECT COUNT(*) FROM transactions").fetchone()[0] == 1
+    assert db.execute("SELECT COUNT(*) FROM attachments").fetchone()[0] == 1
+    assert len(stored_files(app)) == 1
+
+
+def test_compressed_blobs_read_back_unchanged(app, db):
+    a = create_account(app, "A", 10)
+    text = b"fuel receipt, litres and amount\n" * 500
+    png = b"\x89PNG\r\n\x1a\n" + os.urandom(8192)
+    text_path = post_with_attachment(app, a, text, "receipt.txt")
+    png_path = post_with_attachment(app, a, png, "receipt.png")
+
+    assert text_path.endswith(app.ATTACHMENT_ENCODINGS[app.ATTACHMENT_ENCODING])
+    assert os.path.getsize(text_path) < len(text)
+    assert not png_path.endswith(tuple(app.ATTACHMENT_ENCODINGS.values()))
+    text_id, png_id = [row[0] for row in db.execute("SELECT id FROM transactions ORDER BY id")]
+    assert app.read_transaction_attachment(text_id) == ("receipt.txt", "text/plain", text)
+    assert app.read_transaction_attachment(png_id) == ("receipt.png", "image/png", png)
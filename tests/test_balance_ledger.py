@@ -0,0 +1,14 @@
+import datetime
+from decimal import Decimal
+
+from conftest import create_account, ledger_rows
+
+
+def test_back_dated_posting_shifts_later_running_balances(app, db):
+    a = create_account(app, "A", 10)
+    app.add_transaction((datetime.date(2024, 3, 1), "DEPOSIT", "", 5, None, a, None))
+    app.add_transaction((datetime.date(2024, 1, 1), "EXPENSE", "", 2, a, None, None))
+    assert [row[4] for row in ledger_rows(db)] == [800, 1300]
+    assert app.get_balance_as_of(a, "2023-12-31") == Decimal("10.00")
+    assert app.get_balance_as_of(a, "2024-02-01") == Decimal("8.00")
+    assert app.get_balance_as_of(a, "2024-12-31") == Decimal("13.00")
@@ -0,0 +1,41 @@
+import datetime
+
+import pandas as pd
+
+from conftest import create_account
+
+
+def test_burn_rate_counts_expenses_up_to_today(app):
+    a = create_account(app, "A", 1000)
+    today = datetime.date.today()
+    for days_ago, amount in ((0, 30), (10, 30), (400, 500)):
+        app.add_transaction((today - datetime.timedelta(days=days_ago), "EXPENSE", "", amount, a, None, None))
+    app.add_transaction((today + datetime.timedelta(days=5), "EXPENSE", "", 100, a, None, None))
+
+    burn = app.custodian_burn_rate(app.get_analytics_frame(), app.get_accounts(), days=30)
+    assert burn.loc[0, "spent"] == 60
+    assert burn.loc[0, "daily_burn"] == 2
+    assert burn.loc[0, "runway_days"] == 170
+
+
+def test_burn_rate_without_accounts_is_empty(app):
+    frame = pd.DataFrame({
+        "date": pd.to_datetime(["2024-01-01"]),
+        "type": pd.Categorical(["EXPENSE"], categories=app.TRANSACTION_TYPES),
+        "description": ["fuel"],
+        "amount": [5.0],
+        "from_account_id": pd.array([1], dtype="Int64"),
+        "to_account_id": pd.array([None], dtype="Int64"),
+    })
+    assert app.custodian_burn_rate(frame, []).empty
+
+
+def test_analytics_frame_reloads_after_reset_and_repost(app):
+    a = create_account(app, "A")
+    app.add_transaction((datetime.date(2024, 1, 1), "EXPENSE", "before reset", 1, a, None, None))
+    assert app.load_analytics_frame(app.current_transactions_version())["description"].tolist() == ["before reset"]
+
+    app.reset_database()
+    a = create_account(app, "A")
+    app.add_transaction((datetime.date(2024, 1, 1), "EXPENSE", "after reset", 1, a, None, None))
+    assert app.load_analytics_frame(app.current_transactions_version())["description"].tolist() == ["after reset"]
@@ -0,0 +1,49 @@
+import datetime
+import subprocess
+import sys
+from decimal import Decimal
+
+from conftest import APP_PATH, create_account
+
+
+def cached_balance(app, name):
+    accounts = app.load_accounts(app.current_data_version())
+    return next(account["balance"] for account in accounts if account["name"] == name)
+
+
+def test_every_write_bumps_the_data_version(app):
+    versions = [app.current_data_version()]
+    a = create_account(app, "A", 10)
+    versions.append(app.current_data_version())
+    app.add_transaction((datetime.date(2024, 1, 1), "DEPOSIT", "", 5, None, a, None))
+    versions.append(app.current_data_version())
+    app.import_transactions([{"date": "2024-01-02", "type": "DEPOSIT", "amount": "1", "to_account": "A"}])
+    versions.append(app.current_data_version())
+    app.close_period("2024-01")
+    versions.append(app.current_data_version())
+    assert versions == sorted(set(versions))
+
+
+
+def test_only_transaction_writes_move_the_transactions_version(app):
+    a = create_account(app, "A", 10)
+    version = app.current_transactions_version()
+    app.add_transaction((datetime.date(2024, 1, 1), "DEPOSIT", "", 5, None, a, None))
+    assert app.current_transactions_version() == version + 1
+    app.import_transactions([{"date": "2024-01-02", "type": "DEPOSIT", "amount": "1", "to_account": "A"}])
+    assert app.current_transactions_version() == version + 2
+
+    create_account(app, "B")
+    app.close_period("2024-01")
+    assert app.current_transactions_version() == version + 2
+    app.reset_database()
+    assert app.current_transactions_version() == version + 3
+
+def test_command_line_writes_reach_the_running_app(app, workdir):
+    create_account(app, "Cash", 10)
+    assert cached_balance(app, "Cash") == Decimal("10.00")
+
+    (workdir / "deposits.csv").write_text("date,type,amount,to_account\n2024-01-02,DEPOSIT,2.50,Cash\n")
+    subprocess.run([sys.executable, str(APP_PATH), "import", "deposits.csv"], check=True, capture_output=True)
+
+    assert cached_balance(app, "Cash") == Decimal("12.50")
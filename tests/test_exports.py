@@ -0,0 +1,87 @@
+import csv
+import datetime
+import gzip
+import io
+import json
+import os
+from decimal import Decimal
+
+import pyarrow.parquet as pq
+from openpyxl import load_workbook
+
+from conftest import create_account
+
+
+def export(app, export_format, **filters):
+    export_writer, _, _ = app.EXPORT_FORMATS[export_format]
+    return app.export_bytes(export_writer, **filters)
+
+
+def seed(app):
+    a = create_account(app, "A", 100)
+    b = create_account(app, "B")
+    app.add_transaction((datetime.date(2024, 1, 5), "DEPOSIT", "float", 10.1, None, a, None))
+    app.add_transaction((datetime.date(2024, 2, 1), "TRANSFER", "café run", 0.3, a, b, None))
+    return a, b
+
+
+def test_csv_export(app):
+    seed(app)
+    rows = list(csv.reader(io.StringIO(export(app, "CSV").decode("utf-8"))))
+    assert rows == [
+        app.EXPORT_COLUMNS,
+        ["2024-01-05", "DEPOSIT", "float", "10.10", "", "A", ""],
+        ["2024-02-01", "TRANSFER", "café run", "0.30", "A", "B", ""],
+    ]
+
+
+def test_excel_export(app):
+    seed(app)
+    sheet = load_workbook(io.BytesIO(export(app, "Excel")), read_only=True).active
+    rows = list(sheet.iter_rows(values_only=True))
+    assert rows[0] == tuple(app.EXPORT_COLUMNS)
+    assert [row[:3] for row in rows[1:]] == [("2024-01-05", "DEPOSIT", "float"), ("2024-02-01", "TRANSFER", "café run")]
+
+
+def test_parquet_export_keeps_exact_decimals(app):
+    seed(app)
+    table = pq.read_table(io.BytesIO(export(app, "Parquet")))
+    assert table.schema == app.EXPORT_PARQUET_SCHEMA
+    assert table.column("amount").to_pylist() == [Decimal("10.10"), Decimal("0.30")]
+    assert table.column("to_account").to_pylist() == ["A", "B"]
+
+
+def test_jsonl_export(app):
+    seed(app)
+    lines = gzip.decompress(export(app, "JSON Lines (gzip)")).decode("utf-8").splitlines()
+    assert [json.loads(line) for line in lines] == [
+        {"date": "2024-01-05", "type": "DEPOSIT", "description": "float", "amount": 10.1,
+         "from_account": None, "to_account": "A", "file_path": None},
+        {"date": "2024-02-01", "type": "TRANSFER", "description": "café run", "amount": 0.3,
+         "from_account": "A", "to_account": "B", "file_path": None},
+    ]
+
+
+def test_export_filters_are_applied_in_sql(app):
+    a, b = seed(app)
+    rows = list(csv.reader(io.StringIO(export(app, "CSV", account_id=b).decode("utf-8"))))
+    assert [row[2] for row in rows[1:]] == ["café run"]
+    rows = list(csv.reader(io.StringIO(export(
+        app, "CSV", start_date=datetime.date(2024, 1, 1), end_date=datetime.date(2024, 1, 31),
+    ).decode("utf-8"))))
+    assert [row[2] for row in rows[1:]] == ["float"]
+
+
+def test_each_export_writes_its_own_temporary_file(app):
+    seed(app)
+    paths = []
+    write_csv = app.export_transactions_csv
+
+    def recording_writer(path, **filters):
+        paths.append(path)
+        write_csv(path, **filters)
+
+    app.export_bytes(recording_writer)
+    app.export_bytes(recording_writer)
+    assert len(set(paths)) == 2
+    assert not any(os.path.exists(path) for path in paths)
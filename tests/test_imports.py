@@ -0,0 +1,35 @@
+import datetime
+from decimal import Decimal
+
+from conftest import balances, create_account, ledger_rows
+
+
+def test_import_matches_a_full_ledger_rebuild(app, db):
+    a = create_account(app, "A", 100)
+    create_account(app, "B", 0)
+    app.add_transaction((datetime.date(2024, 2, 1), "EXPENSE", "", 10, a, None, None))
+    imported, errors = app.import_transactions([
+        {"date": "2024-01-15", "type": "transfer", "amount": "25.5", "from_account": "A", "to_account": "B"},
+        {"date": "2024-03-01", "type": "DEPOSIT", "amount": "4", "to_account": "B"},
+    ])
+    assert (imported, errors) == (2, [])
+    incremental = ledger_rows(db)
+    conn = app.get_connection_pool().acquire()
+    try:
+        app.rebuild_balance_ledger(conn)
+        conn.commit()
+    finally:
+        app.get_connection_pool().release(conn)
+    assert ledger_rows(db) == incremental
+    assert balances(app) == {"A": Decimal("64.50"), "B": Decimal("29.50")}
+
+
+def test_invalid_import_writes_nothing(app, db):
+    create_account(app, "A", 0)
+    imported, errors = app.import_transactions([
+        {"date": "2024-01-15", "type": "DEPOSIT", "amount": "5", "to_account": "A"},
+        {"date": "not a date", "type": "BOGUS", "amount": "x", "to_account": "Nobody"},
+    ])
+    assert imported == 0
+    assert len(errors) == 1 and errors[0].startswith("row 3:")
+    assert db.execute("SELECT COUNT(*) FROM transactions").fetchone()[0] == 0
@@ -0,0 +1,49 @@
+import datetime
+
+from conftest import create_account
+
+
+def query_plan(db, sql):
+    return " | ".join(row[3] for row in db.execute("EXPLAIN QUERY PLAN " + sql))
+
+
+def traced_select(statements):
+    return next(sql for sql in reversed(statements) if sql.lstrip().upper().startswith("SELECT"))
+
+
+def test_init_database_creates_transaction_indexes(app, db):
+    indexes = {row[0] for row in db.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert set(app.TRANSACTION_INDEXES) <= indexes
+
+
+def test_newest_page_walks_the_date_index(app, db, traced_sql):
+    app.get_transactions_page(page_size=10)
+    plan = query_plan(db, traced_select(traced_sql))
+    assert "idx_transactions_date" in plan
+    assert "USE TEMP B-TREE FOR ORDER BY" not in plan
+
+
+def test_older_page_seeks_the_date_index(app, db, traced_sql):
+    app.get_transactions_page(page_size=10, cursor=("2024-06-01", 50))
+    plan = query_plan(db, traced_select(traced_sql))
+    assert "idx_transactions_date" in plan
+    assert "USE TEMP B-TREE FOR ORDER BY" not in plan
+
+
+def test_from_account_filter_uses_the_account_index(app, db, traced_sql):
+    account_id = create_account(app, "Cash A", 100)
+    app.add_transaction((datetime.date(2024, 1, 5), "EXPENSE", "fuel", 10, account_id, None, None))
+    db.execute("ANALYZE")
+    db.commit()
+    traced_sql.clear()
+    app.get_transactions_page(page_size=10, filters={"from_account_id": account_id})
+    plan = query_plan(db, traced_select(traced_sql))
+    assert "idx_transactions_from_account_date" in plan
+
+
+def test_backfill_batch_seeks_its_id_range(app, db):
+    cte, params = app.postings_cte((1, 100))
+    plan = " | ".join(
+        row[3] for row in db.execute(f"EXPLAIN QUERY PLAN WITH {cte} SELECT * FROM postings", params)
+    )
+    assert plan.count("SEARCH t USING INTEGER PRIMARY KEY (rowid>? AND rowid<?)") == 2
@@ -0,0 +1,149 @@
+import datetime
+import os
+import sqlite3
+from decimal import Decimal
+
+import pytest
+
+from conftest import create_account, interrupted_on_call
+
+# Schema written by the original script, before migrations existed
+LEGACY_SCHEMA = '''
+    CREATE TABLE accounts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL UNIQUE,
+        balance REAL DEFAULT 0
+    );
+    CREATE TABLE transactions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        date TEXT NOT NULL,
+        type TEXT NOT NULL,
+        description TEXT,
+        amount REAL NOT NULL,
+        from_account_id INTEGER,
+        to_account_id INTEGER,
+        file_path TEXT,
+        FOREIGN KEY (from_account_id) REFERENCES accounts (id),
+        FOREIGN KEY (to_account_id) REFERENCES accounts (id)
+    );
+'''
+
+
+# Swap the app's database for one created by the original script
+def write_legacy_database(app):
+    app.get_connection_pool().close_all()
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(app.DB_FILENAME + suffix):
+            os.remove(app.DB_FILENAME + suffix)
+    conn = sqlite3.connect(app.DB_FILENAME)
+    conn.executescript(LEGACY_SCHEMA)
+    conn.executemany("INSERT INTO accounts (name, balance) VALUES (?, ?)", [("Cash", 89.9), ("Bank", 10.1)])
+    conn.executemany(
+        "INSERT INTO transactions (date, type, description, amount, from_account_id, to_account_id) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        [
+            ("2024-01-05", "DEPOSIT", "float", 100.0, None, 1),
+            ("2024-02-01", "TRANSFER", "to bank", 10.1, 1, 2),
+        ],
+    )
+    conn.commit()
+    return conn
+
+
+def test_interrupted_ledger_backfill_resumes(app_loader, monkeypatch):
+    app = app_loader()
+    conn = write_legacy_database(app)
+    # One account per batch; the second batch dies
+    monkeypatch.setattr(app, "LEDGER_BACKFILL_ACCOUNTS", 1)
+    with interrupted_on_call(monkeypatch, app, "rebuild_balance_ledger", 2):
+        app.apply_migrations(conn)
+    conn.close()
+    assert app.get_schema_version(sqlite3.connect(app.DB_FILENAME)) == 0
+
+    app = app_loader()
+    assert app.get_balance_as_of(1, "2024-12-31") == Decimal("89.90")
+    assert app.get_balance_as_of(2, "2024-12-31") == Decimal("10.10")
+    assert app.get_balance_as_of(1, "2024-01-31") == Decimal("100.00")
+
+
+def test_legacy_database_reaches_current_schema(app_loader):
+    app = app_loader()
+    write_legacy_database(app).close()
+    app = app_loader()
+    db = sqlite3.connect(app.DB_FILENAME)
+    assert app.get_schema_version(db) == app.SCHEMA_VERSION
+    assert db.execute("SELECT name, balance, opening_balance FROM accounts ORDER BY id").fetchall() == [
+        ("Cash", 8990, 0), ("Bank", 1010, 0),
+    ]
+    assert db.execute("SELECT typeof(amount) FROM transactions GROUP BY 1").fetchall() == [("integer",)]
+    db.close()
+
+
+def summary_rows(db):
+    return (
+        db.execute("SELECT * FROM daily_summary ORDER BY account_id, day, type").fetchall(),
+        db.execute("SELECT * FROM monthly_summary ORDER BY account_id, month").fetchall(),
+    )
+
+
+def test_summary_backfill_matches_summaries_kept_on_write(app, db, monkeypatch):
+    a = create_account(app, "A", 100)
+    b = create_account(app, "B")
+    for day, transaction_type, amount, from_id, to_id in (
+        (1, "DEPOSIT", 10, None, a),
+        (1, "EXPENSE", 2.5, a, None),
+        (15, "TRANSFER", 4, a, b),
+        (40, "EXPENSE", 1, b, None),
+    ):
+        date = datetime.date(2024, 1, 1) + datetime.timedelta(days=day)
+        app.add_transaction((date, transaction_type, "", amount, from_id, to_id, None))
+    kept_on_write = summary_rows(db)
+
+    monkeypatch.setattr(app, "MIGRATION_BATCH_SIZE", 1)
+    with interrupted_on_call(monkeypatch, app, "backfill_summaries", 3):
+        app.migrate_summaries(db)
+    db.rollback()
+    app.migrate_summaries(db)
+    assert summary_rows(db) == kept_on_write
+
+
+def test_interrupted_search_index_backfill_resumes(app, db, monkeypatch):
+    a = create_account(app, "A")
+    descriptions = ["fuel station", "office chairs", "fuel card", None, "courier"]
+    for description in descriptions:
+        app.add_transaction((datetime.date(2024, 1, 1), "EXPENSE", description, 1, a, None, None))
+    # Back to a database from before the index existed
+    for trigger_name in app.TRANSACTIONS_FTS_TRIGGERS:
+        db.execute(f"DROP TRIGGER {trigger_name}")
+    db.execute("DROP TABLE transactions_fts")
+    db.commit()
+
+    monkeypatch.setattr(app, "MIGRATION_BATCH_SIZE", 2)
+    with interrupted_on_call(monkeypatch, app, "backfill_transactions_fts", 3):
+        app.migrate_transactions_fts(db)
+    db.rollback()
+    app.migrate_transactions_fts(db)
+    app.migrate_transactions_fts(db)
+
+    db.execute("INSERT INTO transactions_fts (transactions_fts, rank) VALUES ('integrity-check', 1)")
+    assert db.execute("SELECT COUNT(*) FROM transactions_fts_docsize").fetchone()[0] == len(descriptions)
+    total, matches = app.search_transactions("fuel")
+    assert total == 2
+
+
+def test_interrupted_money_rewrite_resumes(app_loader, monkeypatch):
+    app = app_loader()
+    conn = write_legacy_database(app)
+    # One row per batch: both accounts are copied, then the first transaction batch dies
+    monkeypatch.setattr(app, "MIGRATION_BATCH_SIZE", 1)
+    with interrupted_on_call(monkeypatch, app, "copy_in_minor_units", 3):
+        app.apply_migrations(conn)
+    assert conn.execute("SELECT typeof(amount) FROM transactions GROUP BY 1").fetchall() == [("real",)]
+    conn.close()
+
+    app = app_loader()
+    db = sqlite3.connect(app.DB_FILENAME)
+    assert db.execute("SELECT id, amount FROM transactions ORDER BY id").fetchall() == [(1, 10000), (2, 1010)]
+    assert db.execute("SELECT name FROM sqlite_master WHERE name LIKE '%_migrated'").fetchall() == []
+    db.close()
+    assert app.get_balance_as_of(1, "2024-12-31") == Decimal("89.90")
@@ -0,0 +1,12 @@
+import datetime
+from decimal import Decimal
+
+from conftest import balances, create_account
+
+
+def test_money_is_stored_in_minor_units(app, db):
+    a = create_account(app, "A", 0)
+    for _ in range(3):
+        app.add_transaction((datetime.date(2024, 1, 1), "DEPOSIT", "", 0.1, None, a, None))
+    assert db.execute("SELECT balance FROM accounts WHERE id = ?", (a,)).fetchone()[0] == 30
+    assert balances(app)["A"] == Decimal("0.30")
@@ -0,0 +1,178 @@
+import datetime
+import io
+import os
+import sqlite3
+from decimal import Decimal
+
+import pytest
+
+from conftest import create_account, interrupted_on_call
+
+
+@pytest.fixture
+def archived_app(app_loader, monkeypatch):
+    monkeypatch.setenv("CASH_CUSTODY_ARCHIVE_DB", "archive.db")
+    return app_loader()
+
+
+def post_expenses(app, account_id, *dates):
+    for date in dates:
+        app.add_transaction((date, "EXPENSE", f"spent {date}", 1, account_id, None, None))
+
+
+def exported_dates(app):
+    return sorted(str(row[0]) for chunk in app.iter_export_chunks() for row in chunk)
+
+
+def table_counts(app):
+    db = sqlite3.connect(app.DB_FILENAME)
+    archive = sqlite3.connect("archive.db")
+    counts = (
+        db.execute("SELECT COUNT(*) FROM transactions").fetchone()[0],
+        archive.execute("SELECT COUNT(*) FROM transactions_archive").fetchone()[0],
+    )
+    db.close()
+    archive.close()
+    return counts
+
+
+def test_close_snapshots_balances_and_freezes_the_period(app):
+    a = create_account(app, "A", 10)
+    post_expenses(app, a, datetime.date(2024, 1, 10), datetime.date(2024, 2, 10))
+    assert app.close_period("2024-01") == 0
+
+    assert app.get_balance_snapshots("2024-01") == [{"account": "A", "closing_balance": Decimal("9.00")}]
+    with pytest.raises(ValueError):
+        post_expenses(app, a, datetime.date(2024, 1, 31))
+    imported, errors = app.import_transactions([
+        {"date": "2024-01-31", "type": "EXPENSE", "amount": "1", "from_account": "A"},
+    ])
+    assert imported == 0 and errors
+    with pytest.raises(ValueError):
+        app.close_period("2024-01")
+
+    post_expenses(app, a, datetime.date(2024, 2, 1))
+    assert app.get_balance_as_of(a, "2024-02-29") == Decimal("7.00")
+
+
+def test_refused_posting_stores_no_attachment(app, db):
+    a = create_account(app, "A", 10)
+    app.close_period("2024-01")
+
+    with pytest.raises(ValueError):
+        app.add_transaction(
+            (datetime.date(2024, 1, 15), "EXPENSE", "late receipt", 1, a, None, None),
+            (io.BytesIO(b"receipt"), "receipt.txt", "text/plain"),
+        )
+    assert db.execute("SELECT COUNT(*) FROM attachments").fetchone()[0] == 0
+    assert not os.path.exists(app.ATTACHMENT_FOLDER) or not any(files for _, _, files in os.walk(app.ATTACHMENT_FOLDER))
+
+
+def test_archiving_moves_closed_transactions(archived_app):
+    app = archived_app
+    a = create_account(app, "A", 10)
+    post_expenses(app, a, datetime.date(2024, 1, 10), datetime.date(2024, 2, 10), datetime.date(2024, 3, 10))
+    assert app.close_period("2024-02", archive=True) == 2
+
+    assert table_counts(app) == (1, 2)
+    assert exported_dates(app) == ["2024-01-10", "2024-02-10", "2024-03-10"]
+    assert app.get_balance_as_of(a, "2024-01-31") == Decimal("9.00")
+    assert app.get_balance_as_of(a, "2024-12-31") == Decimal("7.00")
+
+
+def test_interrupted_archive_move_is_finished_by_the_next_close(archived_app, monkeypatch):
+    app = archived_app
+    a = create_account(app, "A", 10)
+    post_expenses(app, a, datetime.date(2024, 1, 10), datetime.date(2024, 2, 10), datetime.date(2024, 3, 10))
+    app.close_period("2024-01", archive=True)
+
+    # Die after the copy into the archive has committed, before the hot rows go
+    with interrupted_on_call(monkeypatch, app, "bump_data_version", 2):
+        app.close_period("2024-02", archive=True)
+
+    assert table_counts(app) == (2, 2)
+    assert exported_dates(app) == ["2024-01-10", "2024-02-10", "2024-03-10"]
+
+    assert app.close_period("2024-02", archive=True) == 1
+    assert table_counts(app) == (1, 2)
+    assert exported_dates(app) == ["2024-01-10", "2024-02-10", "2024-03-10"]
+
+
+def period_checked_under_write_lock(statements):
+    begin = next(i for i, sql in enumerate(statements) if sql.startswith("BEGIN IMMEDIATE"))
+    period_read = next(i for i, sql in enumerate(statements) if "period_closes" in sql)
+    return begin < period_read
+
+
+def test_postings_check_the_period_under_the_write_lock(app, traced_sql):
+    a = create_account(app, "A", 10)
+    traced_sql.clear()
+    post_expenses(app, a, datetime.date(2024, 1, 10))
+    assert period_checked_under_write_lock(traced_sql)
+
+    traced_sql.clear()
+    app.import_transactions([{"date": "2024-01-11", "type": "EXPENSE", "amount": "1", "from_account": "A"}])
+    assert period_checked_under_write_lock(traced_sql)
+
+
+def test_reset_clears_rows_left_by_an_interrupted_first_archive(archived_app, monkeypatch):
+    app = archived_app
+    a = create_account(app, "A", 10)
+    post_expenses(app, a, datetime.date(2024, 1, 10))
+    with interrupted_on_call(monkeypatch, app, "bump_data_version", 2):
+        app.close_period("2024-01", archive=True)
+
+    app.reset_database()
+    a = create_account(app, "A", 10)
+    post_expenses(app, a, datetime.date(2024, 3, 10))
+    app.close_period("2024-03", archive=True)
+
+    assert exported_dates(app) == ["2024-03-10"]
+    assert app.get_analytics_frame()["date"].dt.strftime("%Y-%m-%d").tolist() == ["2024-03-10"]
+
+
+def test_archived_transactions_stay_in_the_panel_and_search(archived_app):
+    app = archived_app
+    a = create_account(app, "A", 10)
+    for date, description in (
+        (datetime.date(2024, 1, 10), "fuel january"),
+        (datetime.date(2024, 1, 20), "office"),
+        (datetime.date(2024, 2, 10), "fuel february"),
+        (datetime.date(2024, 3, 10), "fuel march"),
+    ):
+        app.add_transaction((date, "EXPENSE", description, 1, a, None, None))
+    assert app.search_transactions("fuel")[0] == 3
+    app.close_period("2024-01", archive=True)
+
+    total, matches = app.search_transactions("fuel")
+    assert total == 3
+    assert sorted(row[1] for row in matches) == ["2024-01-10", "2024-02-10", "2024-03-10"]
+    assert app.search_transactions("fuel", page_size=2, page=1)[1][0][0] in {row[0] for row in matches}
+
+    january = {"start_date": datetime.date(2024, 1, 1), "end_date": datetime.date(2024, 1, 31)}
+    assert [row[3] for row in app.get_transactions_page(10, filters=january)[0]] == ["office", "fuel january"]
+    assert app.count_transactions(january) == 2
+    assert app.get_transaction_stats()[0] == 4
+
+    # Pages run across both tables in (date, id) order
+    page, _, next_cursor = app.get_transactions_page(3)
+    assert [row[1] for row in page] == ["2024-03-10", "2024-02-10", "2024-01-20"]
+    page, prev_cursor, next_cursor = app.get_transactions_page(3, next_cursor)
+    assert [row[1] for row in page] == ["2024-01-10"] and next_cursor is None
+    page, _, _ = app.get_transactions_page(3, prev_cursor, "prev")
+    assert [row[1] for row in page] == ["2024-03-10", "2024-02-10", "2024-01-20"]
+
+
+def test_archives_from_before_the_archive_index_are_indexed(archived_app):
+    app = archived_app
+    a = create_account(app, "A", 10)
+    app.add_transaction((datetime.date(2024, 1, 10), "EXPENSE", "fuel", 1, a, None, None))
+    app.close_period("2024-01", archive=True)
+    archive = sqlite3.connect("archive.db")
+    archive.execute("DROP TABLE transactions_archive_fts")
+    archive.commit()
+    archive.close()
+
+    with app.get_connection() as conn:
+        app.migrate_archive_fts(conn)
+    assert app.search_transactions("fuel")[0] == 1
@@ -0,0 +1,13 @@
+import datetime
+from decimal import Decimal
+
+from conftest import balances, create_account
+
+
+def test_posting_rules_move_account_balances(app):
+    a = create_account(app, "A", 100)
+    b = create_account(app, "B", 0)
+    app.add_transaction((datetime.date(2024, 1, 1), "DEPOSIT", "top up", 50, None, a, None))
+    app.add_transaction((datetime.date(2024, 1, 2), "EXPENSE", "fuel", 20.25, a, None, None))
+    app.add_transaction((datetime.date(2024, 1, 3), "TRANSFER", "handover", 30, a, b, None))
+    assert balances(app) == {"A": Decimal("99.75"), "B": Decimal("30.00")}
@@ -0,0 +1,42 @@
+import datetime
+
+from conftest import create_account
+
+
+def test_filter_conditions_skip_empty_fields(app):
+    assert app.transaction_filter_conditions() == ([], [])
+    conditions, params = app.transaction_filter_conditions(
+        start_date=datetime.date(2024, 1, 1), transaction_type="EXPENSE", account_id=3, min_amount=1.5,
+    )
+    assert conditions == ["t.date >= ?", "t.type = ?", "(t.from_account_id = ? OR t.to_account_id = ?)",
+                          "t.amount >= ?"]
+    assert params == ["2024-01-01", "EXPENSE", 3, 3, 150]
+
+
+def test_filtered_pages_walk_every_match_once(app):
+    a = create_account(app, "A", 100)
+    b = create_account(app, "B", 100)
+    expected = []
+    for day in range(1, 11):
+        date = datetime.date(2024, 1, day)
+        app.add_transaction((date, "DEPOSIT", f"deposit {day}", day, None, a, None))
+        if day % 3 == 0:
+            app.add_transaction((date, "EXPENSE", f"other {day}", day, b, None, None))
+        else:
+            app.add_transaction((date, "EXPENSE", f"fuel {day}", day, a, None, None))
+            if day >= 3:
+                expected.insert(0, f"fuel {day}")
+    filters = {"transaction_type": "EXPENSE", "account_id": a, "min_amount": 3}
+    assert app.count_transactions(filters) == len(expected)
+
+    pages, cursor = [], None
+    while True:
+        transactions, prev_cursor, cursor = app.get_transactions_page(3, cursor, "next", filters)
+        pages.append(transactions)
+        if cursor is None:
+            break
+    assert [row[3] for page in pages for row in page] == expected
+    assert [len(page) for page in pages] == [3, 2]
+
+    transactions, prev_cursor, _ = app.get_transactions_page(3, prev_cursor, "prev", filters)
+    assert transactions == pages[0] and prev_cursor is None
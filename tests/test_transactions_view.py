@@ -0,0 +1,48 @@
+import datetime
+
+from conftest import create_account
+
+
+def post(app, account_id, day, description):
+    app.add_transaction((datetime.date(2024, 1, day), "DEPOSIT", description, 1, None, account_id, None))
+
+
+# Session-state view of the newest page, as render_transactions keeps it
+def newest_page_view(app, page_size):
+    total, high_water_mark = app.get_transaction_stats()
+    transactions, prev_cursor, next_cursor = app.get_transactions_page(page_size)
+    return {
+        "frame": app.transactions_frame(transactions),
+        "high_water_mark": high_water_mark,
+        "total": total,
+        "cursors": (prev_cursor, next_cursor),
+    }
+
+
+def test_new_postings_are_patched_into_the_newest_page(app):
+    a = create_account(app, "A")
+    for day in (1, 2, 3):
+        post(app, a, day, f"old {day}")
+    view = newest_page_view(app, 3)
+    post(app, a, 4, "new")
+
+    total, _ = app.get_transaction_stats()
+    frame, next_cursor = app.refresh_newest_page(view, total, 3)
+    assert frame["Description"].tolist() == ["new", "old 3", "old 2"]
+    assert next_cursor == ("2024-01-02", 2)
+
+
+def test_reset_and_repost_reloads_the_newest_page(app):
+    a = create_account(app, "A")
+    for day in (1, 2, 3):
+        post(app, a, day, f"before reset {day}")
+    view = newest_page_view(app, 25)
+
+    app.reset_database()
+    a = create_account(app, "A")
+    for day in (1, 2, 3):
+        post(app, a, day, f"after reset {day}")
+
+    total, high_water_mark = app.get_transaction_stats()
+    assert high_water_mark > view["high_water_mark"]
+    assert app.refresh_newest_page(view, total, 25) is None